@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from backend.cache import TwoTierCache
+
+User = get_user_model()
+
+tokens = TwoTierCache(
+    'token',
+    local_size=settings.TOKEN_CACHE_LOCAL_SIZE,
+    timeout=settings.TOKEN_CACHE_TIMEOUT,
+)
+
+
+def freeze(instance):
+    """Значения полей объекта в неизменяемом виде для кеша."""
+    return tuple(
+        getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+    )
+
+
+def thaw(model, values):
+    """Новый объект модели из значений, сохранённых freeze()."""
+    return model.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in model._meta.concrete_fields],
+        values
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешированием пользователя.
+
+    Пользователь ищется в двухуровневом кеше (backend.cache) и только
+    потом в БД. В кеше лежат значения полей, а каждый запрос получает
+    свой объект пользователя: представления меняют request.user.
+    Запись удаляется во всех процессах при удалении токена и при
+    сохранении пользователя. QuerySet.update() сигналов не отправляет,
+    такие изменения видны через TOKEN_CACHE_TIMEOUT.
+
+    Общий кеш должен быть общим для всех процессов, которые проверяют
+    токены: файловый кеш годится для воркеров одного контейнера, для
+    нескольких контейнеров или серверов нужен memcached или redis.
+    """
+
+    def authenticate_credentials(self, key):
+        load = super().authenticate_credentials
+        user_values, token_values = tokens.get_or_set(
+            key, lambda: tuple(map(freeze, load(key)))
+        )
+        user = thaw(User, user_values)
+        token = thaw(Token, token_values)
+        token.user = user
+        return user, token
+
+    @classmethod
+    def invalidate(cls, *keys):
+        if keys:
+            tokens.delete(*keys)
+
+    @classmethod
+    def get_stats(cls):
+        return tokens.get_stats()
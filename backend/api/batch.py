@@ -0,0 +1,122 @@
+"""Пакетные запросы: несколько вызовов API за один HTTP-запрос.
+
+Подзапросы выполняются по очереди в том же процессе через URL resolver,
+минуя middleware, и используют уже проверенного пользователя пакета.
+Кеш на время запроса (например, подписки пользователя) общий для всех
+подзапросов и сбрасывается после каждого изменяющего подзапроса.
+Ответы DRF попадают в результат без промежуточной сериализации в JSON.
+
+Изменяющий подзапрос выполняется в своей транзакции: упавший откатывает
+только свои изменения, а исключение становится ответом со статусом 500
+и не прерывает пакет. Эндпоинты, которые отдают не JSON, в пакете
+недоступны.
+"""
+import asyncio
+import json
+import logging
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+from rest_framework.permissions import SAFE_METHODS
+
+from api.utils import get_request_cache
+
+logger = logging.getLogger(__name__)
+
+# Заголовки пакета, которые получает каждый подзапрос.
+INHERITED_META = (
+    'REMOTE_ADDR', 'HTTP_X_REAL_IP', 'HTTP_HOST', 'SERVER_NAME',
+    'SERVER_PORT', 'HTTP_ACCEPT_LANGUAGE',
+)
+TEXT_TYPES = ('application/json', 'text/')
+# Эндпоинты с ответом не в JSON: PDF списка покупок и метрики.
+NON_JSON_VIEWS = ('recipes-download-shopping-cart', 'metrics')
+
+
+def get_sync_view(view):
+    """Исходное синхронное представление под обёрткой async_read_view."""
+    while asyncio.iscoroutinefunction(view) and hasattr(view, '__wrapped__'):
+        view = view.__wrapped__
+    return view
+
+
+def build_request(request, method, path, body):
+    url = urlsplit(path)
+    content = b'' if body is None else json.dumps(body).encode()
+    environ = {
+        key: request.META[key] for key in INHERITED_META
+        if key in request.META
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': BytesIO(content),
+        'wsgi.url_scheme': request.scheme,
+    })
+    sub_request = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        # Пользователь уже аутентифицирован запросом пакета.
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    sub_request.request_cache = get_request_cache(request)
+    return sub_request
+
+
+def encode_response(response):
+    if isinstance(response, Response):
+        return {'status': response.status_code, 'body': response.data}
+    content_type = response.get('Content-Type', '')
+    result = {'status': response.status_code, 'body': None}
+    if response.has_header('Location'):
+        result['location'] = response['Location']
+    if response.streaming or not content_type.startswith(TEXT_TYPES):
+        result['content_type'] = content_type
+    elif content_type.startswith('application/json'):
+        result['body'] = json.loads(response.content or 'null')
+    else:
+        result['body'] = response.content.decode(response.charset)
+    return result
+
+
+def call_view(view, sub_request, match):
+    response = view(sub_request, *match.args, **match.kwargs)
+    # Ответ DRF берётся из response.data, рендерить нужно только
+    # остальные шаблонные ответы.
+    if not isinstance(response, Response) and callable(
+        getattr(response, 'render', None)
+    ):
+        response = response.render()
+    return response
+
+
+def dispatch(request, method, path, body=None):
+    """Выполняет один подзапрос и возвращает его ответ для пакета."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return {'status': 404, 'body': {'detail': 'Страница не найдена.'}}
+    if match.url_name in NON_JSON_VIEWS:
+        return {'status': 406, 'body': {'detail': 'Эндпоинт не отдаёт JSON.'}}
+    view = get_sync_view(match.func)
+    sub_request = build_request(request, method, path, body)
+    try:
+        if method in SAFE_METHODS:
+            response = call_view(view, sub_request, match)
+        else:
+            with transaction.atomic():
+                response = call_view(view, sub_request, match)
+    except Exception:
+        logger.exception('Ошибка подзапроса пакета %s %s', method, path)
+        return {'status': 500, 'body': {'detail': 'Ошибка сервера.'}}
+    finally:
+        if method not in SAFE_METHODS:
+            get_request_cache(request).clear()
+    return encode_response(response)
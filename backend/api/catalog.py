@@ -0,0 +1,38 @@
+"""Кеш справочников: тегов и ингредиентов.
+
+Справочники меняются редко (админка, add_data), а читаются на каждой
+странице рецепта и при каждом вводе в поиске ингредиентов. Ответы
+хранятся в двухуровневом кеше и сбрасываются сигналами моделей.
+"""
+from urllib.parse import quote
+
+from django.conf import settings
+
+from api.filters import IngredientFilter
+from api.serializers import IngredientSerializer, TagSerializer
+from backend.cache import TwoTierCache
+from recipes.models import Ingredient, Tag
+
+tags = TwoTierCache(Tag._meta.label_lower, local_size=1)
+ingredients = TwoTierCache(
+    Ingredient._meta.label_lower,
+    local_size=settings.INGREDIENT_CACHE_LOCAL_SIZE,
+)
+
+
+def get_tags():
+    return tags.get_or_set('list', lambda: list(
+        TagSerializer(Tag.objects.all(), many=True).data
+    ))
+
+
+def get_ingredients(name=''):
+    """Ингредиенты, название которых начинается с name."""
+    def load():
+        queryset = IngredientFilter(
+            {'name': name}, Ingredient.objects.all()
+        ).qs
+        return list(IngredientSerializer(queryset, many=True).data)
+
+    # quote: ключи memcached не должны содержать пробелов.
+    return ingredients.get_or_set(quote(name.lower()), load)
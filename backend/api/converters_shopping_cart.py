@@ -1,22 +1,44 @@
+"""PDF со списком покупок.
+
+reportlab импортируется при первой генерации PDF (или при прогреве
+процесса), а не при импорте модуля: он заметно замедляет запуск
+manage.py и холодного воркера.
+"""
+import time
 from io import BytesIO
 
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from django.conf import settings
 from django.http import HttpResponse
 
+from api.metrics import registry
+
+FONT_NAME = 'Alternates'
+FONT_PATH = settings.BASE_DIR / 'data' / 'Alternates.ttf'
+
+
+def register_font():
+    """Регистрирует шрифт, файл разбирается один раз на процесс."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONT_PATH)))
+
 
 def pdf_shopping_cart(shopping_cart):
+    from reportlab.pdfgen import canvas
+
+    started = time.perf_counter()
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = (
         'attachment; filename="shopping_cart.pdf"'
     )
-    pdfmetrics.registerFont(TTFont('Alternates', 'data/Alternates.ttf'))
+    register_font()
     buffer = BytesIO()
     p = canvas.Canvas(buffer)
-    p.setFont('Alternates', 14)
+    p.setFont(FONT_NAME, 14)
     p.drawString(200, 800, 'Список покупок.')
-    p.setFont('Alternates', 14)
+    p.setFont(FONT_NAME, 14)
     from_bottom = 750
     for number, ingredient in enumerate(shopping_cart, start=1):
         p.drawString(
@@ -35,4 +57,8 @@ def pdf_shopping_cart(shopping_cart):
     pdf = buffer.getvalue()
     buffer.close()
     response.write(pdf)
+    registry.observe(
+        'foodgram_pdf_generation_duration_seconds',
+        time.perf_counter() - started
+    )
     return response
@@ -0,0 +1,290 @@
+"""Server-sent events: живые уведомления об изменениях.
+
+ASGI-приложение для /api/events/ работает в отдельном сервисе events,
+а записи делает gunicorn, поэтому процесс узнаёт об изменениях только
+опросом журнала ChangeLog: событие доходит до клиента не позже чем
+через SSE_POLL_INTERVAL. Опрос один на всех клиентов процесса, между
+опросами клиенты не держат соединений с БД. Id события — курсор
+/api/sync/: после обрыва клиент догружает пропущенное через
+/api/sync/?since=<Last-Event-ID>.
+
+EventSource в браузере не умеет передавать заголовки, а токен в адресе
+попал бы в журнал nginx. Поэтому браузер сначала получает короткоживущий
+одноразовый билет через POST /api/events/ticket/ и подключается с
+?ticket=<билет>.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from functools import wraps
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections, router
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.sync import get_position, get_upper, read_entries
+from recipes.models import ChangeLog
+from users.models import Subscriptions
+
+User = get_user_model()
+
+TICKET_SALT = 'api.events.ticket'
+TICKET_KEY = 'sse_ticket:{}'
+
+logger = logging.getLogger(__name__)
+
+
+def db_call(func):
+    """Выполняет func в пуле потоков и сразу закрывает соединения с БД."""
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return wraps(func)(sync_to_async(call, thread_sensitive=False))
+
+
+def issue_ticket(user):
+    """Билет для подключения к /api/events/ из браузера."""
+    return signing.dumps(user.id, salt=TICKET_SALT)
+
+
+def use_ticket(ticket):
+    """Id пользователя из билета; билет можно использовать один раз.
+
+    Использованные билеты отмечаются в общем кеше до истечения срока:
+    add атомарен, поэтому билет не примут два воркера сразу.
+    """
+    try:
+        user_id = signing.loads(
+            ticket, salt=TICKET_SALT, max_age=settings.SSE_TICKET_MAX_AGE
+        )
+    except signing.BadSignature:
+        raise AuthenticationFailed('Недействительный билет.')
+    key = TICKET_KEY.format(hashlib.sha256(ticket.encode()).hexdigest())
+    if not cache.add(key, user_id, settings.SSE_TICKET_MAX_AGE):
+        raise AuthenticationFailed('Билет уже использован.')
+    return user_id
+
+
+def get_followed(user_id):
+    return set(
+        Subscriptions.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        )
+    )
+
+
+@db_call
+def authenticate(key):
+    # Без кеша токенов: сервис events работает в своём контейнере и не
+    # видит инвалидаций из файлового кеша backend.
+    user, _ = TokenAuthentication().authenticate_credentials(key)
+    return user.id, get_followed(user.id)
+
+
+@db_call
+def authenticate_ticket(ticket):
+    user_id = use_ticket(ticket)
+    if not User.objects.filter(id=user_id, is_active=True).exists():
+        raise AuthenticationFailed('Пользователь не найден.')
+    return user_id, get_followed(user_id)
+
+
+@db_call
+def fetch_changes(cursor):
+    """Новые записи журнала после курсора в порядке фиксации (см. api.sync).
+
+    Id события — его позиция: клиент, продолживший с неё через
+    /api/sync/, получит эту транзакцию повторно, но ничего не пропустит.
+    """
+    using = router.db_for_read(ChangeLog)
+    upper = get_upper(using)
+    if cursor is None:
+        return [], upper
+    entries, cursor, _ = read_entries(
+        ChangeLog.objects.using(using), get_position(using), cursor, upper,
+        settings.SYNC_BATCH_SIZE,
+        ('user_id', 'author_id', 'kind', 'object_id', 'op')
+    )
+    return entries, cursor
+
+
+class Client:
+    """Подключение одного пользователя."""
+
+    def __init__(self, user_id, followed):
+        self.user_id = user_id
+        self.followed = followed
+        self.queue = asyncio.Queue(settings.SSE_QUEUE_SIZE)
+        self.overflow = False
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент получит reset и синхронизируется заново.
+            self.overflow = True
+
+
+class EventHub:
+    """Раздаёт записи журнала подключённым клиентам процесса."""
+
+    def __init__(self):
+        self.clients = set()
+        self.cursor = None
+        self.task = None
+        self.starting = None
+
+    async def subscribe(self, client):
+        if self.starting is None:
+            self.starting = asyncio.Lock()
+        async with self.starting:
+            if self.task is None or self.task.done():
+                _, self.cursor = await fetch_changes(None)
+                self.task = asyncio.ensure_future(self.run())
+            self.clients.add(client)
+        return self.cursor
+
+    def unsubscribe(self, client):
+        self.clients.discard(client)
+
+    async def run(self):
+        while self.clients:
+            await asyncio.sleep(settings.SSE_POLL_INTERVAL)
+            try:
+                entries, cursor = await fetch_changes(self.cursor)
+            except Exception:
+                logger.exception('Не удалось прочитать журнал изменений')
+                continue
+            self.cursor = cursor
+            for entry in entries:
+                self.dispatch(entry)
+
+    def dispatch(self, entry):
+        entry_id, user_id, author_id, kind, object_id, op = entry
+        event = (entry_id, kind, {'id': object_id, 'op': op})
+        for client in list(self.clients):
+            if user_id is not None:
+                if client.user_id != user_id:
+                    continue
+                if kind == ChangeLog.SUBSCRIPTION:
+                    if op == ChangeLog.UPSERT:
+                        client.followed.add(object_id)
+                    else:
+                        client.followed.discard(object_id)
+                client.push(event)
+            else:
+                if (author_id in client.followed
+                        or author_id == client.user_id):
+                    client.push(event)
+
+
+hub = EventHub()
+
+
+def format_event(event_id, name, data):
+    return (
+        f'id: {event_id}\nevent: {name}\n'
+        f'data: {json.dumps(data)}\n\n'
+    ).encode()
+
+
+def get_credentials(scope):
+    """Токен из заголовка Authorization или билет из ?ticket=."""
+    headers = dict(scope['headers'])
+    authorization = headers.get(b'authorization', b'').decode().split()
+    if len(authorization) == 2 and authorization[0] == 'Token':
+        return authorization[1], None
+    ticket = parse_qs(scope['query_string'].decode()).get('ticket')
+    return None, ticket[0] if ticket else None
+
+
+async def send_response(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'detail': body}).encode(),
+    })
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def events_application(scope, receive, send):
+    """Поток событий text/event-stream для авторизованного пользователя.
+
+    События: recipe — рецепт отслеживаемого автора или свой, favorite,
+    shopping_cart и subscription — изменения с другого устройства,
+    hello — курсор на момент подключения, reset — пропущены события,
+    нужна синхронизация через /api/sync/.
+    """
+    if scope['method'] != 'GET':
+        return await send_response(send, 405, 'Метод не разрешён.')
+    key, ticket = get_credentials(scope)
+    if key is None and ticket is None:
+        return await send_response(send, 401, 'Нужен токен или билет.')
+    try:
+        if key is not None:
+            user_id, followed = await authenticate(key)
+        else:
+            user_id, followed = await authenticate_ticket(ticket)
+    except AuthenticationFailed as error:
+        return await send_response(send, 401, str(error.detail))
+    client = Client(user_id, followed)
+    cursor = await hub.subscribe(client)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': format_event(cursor, 'hello', {'cursor': cursor}),
+            'more_body': True,
+        })
+        while not disconnect.done():
+            get = asyncio.ensure_future(client.queue.get())
+            done, _ = await asyncio.wait(
+                {get, disconnect},
+                timeout=settings.SSE_HEARTBEAT_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if get in done:
+                body = format_event(*get.result())
+            else:
+                get.cancel()
+                body = b': ping\n\n'
+            if client.overflow:
+                body = format_event(hub.cursor, 'reset', {})
+            if disconnect.done():
+                break
+            await send({
+                'type': 'http.response.body',
+                'body': body,
+                'more_body': not client.overflow,
+            })
+            if client.overflow:
+                break
+    finally:
+        hub.unsubscribe(client)
+        disconnect.cancel()
@@ -1,15 +1,101 @@
-import base64
+import binascii
+import re
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from rest_framework import serializers
 
+DATA_URL_HEADER = re.compile(r'^data:image/(?P<ext>[a-z0-9.+-]+);base64,')
+HEADER_MAX_LENGTH = 64
+WHITESPACE = re.compile(r'\s+')
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+DECODE_CHUNK_SIZE = 64 * 1024 * 4
+# Начало файла каждого формата; у webp между RIFF и WEBP — размер.
+JPEG_SIGNATURE = re.compile(rb'\xff\xd8\xff')
+IMAGE_SIGNATURES = {
+    'png': re.compile(rb'\x89PNG\r\n\x1a\n'),
+    'jpeg': JPEG_SIGNATURE,
+    'jpg': JPEG_SIGNATURE,
+    'gif': re.compile(rb'GIF8[79]a'),
+    'webp': re.compile(rb'RIFF.{4}WEBP', re.DOTALL),
+}
+
 
 class Base64ImageField(serializers.ImageField):
-    """Класс поля для изображений."""
+    """Класс поля для изображений.
+
+    Принимает как обычный файл из multipart/form-data, так и строку
+    data:image/<формат>;base64,... Строка декодируется по частям во
+    временный файл, который уходит на диск после
+    FILE_UPLOAD_MAX_MEMORY_SIZE, а формат и размер проверяются
+    до декодирования всего содержимого. Файл из multipart ограничен тем
+    же IMAGE_MAX_SIZE.
+    """
+
+    default_error_messages = {
+        'image_format': 'Недопустимый формат изображения.',
+        'image_size': 'Размер изображения превышает {max_size} байт.',
+        'image_base64': 'Некорректная строка base64.',
+    }
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode_base64(data)
+        if (isinstance(data, UploadedFile)
+                and data.size > settings.IMAGE_MAX_SIZE):
+            self.fail('image_size', max_size=settings.IMAGE_MAX_SIZE)
         return super().to_internal_value(data)
+
+    def decode_base64(self, data):
+        header = DATA_URL_HEADER.match(data[:HEADER_MAX_LENGTH])
+        if header is None:
+            self.fail('image_base64')
+        ext = header.group('ext')
+        if ext not in IMAGE_SIGNATURES:
+            self.fail('image_format')
+        data = data[header.end():]
+        # Переносы строк сдвинули бы куски относительно групп base64.
+        if WHITESPACE.search(data):
+            data = WHITESPACE.sub('', data)
+        if len(data) // 4 * 3 > settings.IMAGE_MAX_SIZE:
+            self.fail('image_size', max_size=settings.IMAGE_MAX_SIZE)
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            for offset in range(0, len(data), DECODE_CHUNK_SIZE):
+                chunk = binascii.a2b_base64(
+                    data[offset:offset + DECODE_CHUNK_SIZE]
+                )
+                if not offset and not IMAGE_SIGNATURES[ext].match(chunk):
+                    self.fail('image_format')
+                file.write(chunk)
+        except binascii.Error:
+            file.close()
+            self.fail('image_base64')
+        except serializers.ValidationError:
+            file.close()
+            raise
+        size = file.tell()
+        file.seek(0)
+        return UploadedFile(
+            file, name='temp.' + ext, content_type=f'image/{ext}', size=size
+        )
+
+
+class PrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField без запроса к БД на каждое значение.
+
+    Возвращает сам ключ, существование объектов сериализатор проверяет
+    одним запросом на все значения. Типы и ошибки те же, что у
+    PrimaryKeyRelatedField, в том числе с many=True.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
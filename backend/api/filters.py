@@ -1,15 +1,22 @@
 from django_filters.rest_framework import (
+    BaseInFilter,
     BooleanFilter,
     CharFilter,
     FilterSet,
     ModelMultipleChoiceFilter,
+    NumberFilter,
 )
 
 from recipes.models import Recipe, Tag
 
 
+class NumberInFilter(BaseInFilter, NumberFilter):
+    pass
+
+
 class RecipeFilter(FilterSet):
 
+    ids = NumberInFilter(field_name='id')
     is_in_shopping_cart = BooleanFilter(method='get_shopping_cart')
     is_favorited = BooleanFilter(method='get_favorite')
     tags = ModelMultipleChoiceFilter(
@@ -35,6 +42,7 @@ class RecipeFilter(FilterSet):
     class Meta:
         model = Recipe
         fields = (
+            'ids',
             'author',
             'tags',
             'is_favorited',
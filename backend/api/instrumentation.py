@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from api import metrics
+from api.utils import get_client_ip, in_networks
+
+logger = logging.getLogger(__name__)
+
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+class RequestRecorder:
+    """Счётчики одного запроса: SQL, сериализация и общее время."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.action = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.serialize_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    @property
+    def label(self):
+        if self.action:
+            return f'{self.view}.{self.action}'
+        return self.view or 'unresolved'
+
+    @property
+    def duplicates(self):
+        return sum(
+            count - 1 for count in self.statements.values() if count > 1
+        )
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'dup;desc="{self.duplicates} duplicate queries"',
+            f'ser;dur={self.serialize_time * 1000:.1f}',
+            f'app;dur={(total - self.sql_time) * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    def as_log_record(self, request, response, total):
+        return {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': self.label,
+            'total_ms': round(total * 1000, 1),
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'serialize_ms': round(self.serialize_time * 1000, 1),
+            'queries': self.queries,
+            'duplicate_queries': self.duplicates,
+            'top_duplicates': [
+                {'sql': sql[:200], 'count': count}
+                for sql, count in self.statements.most_common(3)
+                if count > 1
+            ],
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка выполнения SQL для RequestRecorder текущего запроса.
+
+    Текущий запрос берётся из contextvars, поэтому учитываются и
+    запросы из потоков sync_to_async в режиме ASGI.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    """Подключает record_query к соединению, обработчик connection_created."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class InstrumentationMiddleware:
+    """Замеряет запрос и отдаёт результат в заголовке Server-Timing.
+
+    Заголовок включается SERVER_TIMING_HEADER и отдаётся только
+    персоналу и служебным адресам: число SQL-запросов и тайминги
+    посторонним видеть незачем.
+
+    Медленные запросы и запросы с большим числом SQL или дублей
+    (признак N+1) пишутся в лог одной JSON-строкой, все запросы
+    попадают в метрики /api/metrics/.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        for alias in connections:
+            install_query_recorder(connections[alias])
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        recorder = RequestRecorder()
+        token = current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(recorder, request, response)
+
+    async def __acall__(self, request):
+        recorder = RequestRecorder()
+        token = current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(recorder, request, response)
+
+    def finish(self, recorder, request, response):
+        total = time.perf_counter() - recorder.started
+        metrics.observe_request(recorder, request, response, total)
+        if settings.SERVER_TIMING_HEADER and self.is_trusted(request):
+            response['Server-Timing'] = recorder.server_timing(total)
+        if (
+            total * 1000 > settings.SLOW_REQUEST_MS
+            or recorder.queries > settings.SLOW_REQUEST_QUERIES
+            or recorder.duplicates > settings.SLOW_REQUEST_DUPLICATE_QUERIES
+        ):
+            logger.warning(json.dumps(
+                recorder.as_log_record(request, response, total),
+                ensure_ascii=False
+            ))
+        return response
+
+    @staticmethod
+    def is_trusted(request):
+        # DRF записывает пользователя по токену и в исходный запрос.
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff) or in_networks(
+            get_client_ip(request), tuple(settings.INTERNAL_NETWORKS)
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = current_recorder.get()
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            recorder.view = f'{view_func.__module__}.{view_func.__name__}'
+            return
+        recorder.view = view_class.__name__
+        actions = getattr(view_func, 'actions', None) or {}
+        recorder.action = actions.get(request.method.lower())
+
+
+class InstrumentedSerializerMixin:
+    """Учитывает время сериализации в текущем RequestRecorder.
+
+    Вложенные сериализаторы не считаются повторно.
+    """
+
+    def to_representation(self, instance):
+        recorder = current_recorder.get()
+        if recorder is None or recorder.serializing:
+            return super().to_representation(instance)
+        recorder.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            recorder.serialize_time += time.perf_counter() - start
+            recorder.serializing = False
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.renderers import ORJSONRenderer, orjson
+from backend.compression import ENCODERS
+
+PATHS = ('/api/recipes/', '/api/recipes/?limit=100', '/api/ingredients/')
+
+
+def cpu_time(func, rounds):
+    """Процессорное время одного вызова в миллисекундах."""
+    func()
+    started = time.process_time()
+    for _ in range(rounds):
+        func()
+    return (time.process_time() - started) / rounds * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Команда сравнивает процессорное время рендеринга JSON стандартным '
+        'json и orjson и размер ответов со сжатием gzip и brotli '
+        'на данных текущей БД'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=PATHS,
+            help='Пути GET-запросов к API.',
+        )
+        parser.add_argument('--rounds', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен, ORJSONRenderer использует json.'
+            ))
+        client = APIClient()
+        for path in options['paths']:
+            response = client.get(path, HTTP_ACCEPT='application/json')
+            if response.status_code != 200:
+                raise CommandError(f'{path}: статус {response.status_code}')
+            self.report(path, response.data, options['rounds'])
+
+    def report(self, path, data, rounds):
+        content = JSONRenderer().render(data)
+        if ORJSONRenderer().render(data) != content:
+            self.stdout.write(self.style.WARNING(
+                f'{path}: ответы json и orjson различаются'
+            ))
+        stdlib = cpu_time(lambda: JSONRenderer().render(data), rounds)
+        fast = cpu_time(lambda: ORJSONRenderer().render(data), rounds)
+        self.stdout.write(self.style.MIGRATE_HEADING(path))
+        self.stdout.write(
+            f'  рендеринг: json {stdlib:.2f} мс, orjson {fast:.2f} мс '
+            f'({stdlib / max(fast, 1e-9):.1f}x)'
+        )
+        self.stdout.write(f'  без сжатия: {len(content)} байт')
+        for name, compress in ENCODERS.items():
+            size = len(compress(content))
+            spent = cpu_time(lambda: compress(content), rounds)
+            self.stdout.write(
+                f'  {name}: {size} байт ({size / len(content):.0%}), '
+                f'{spent:.2f} мс'
+            )
@@ -0,0 +1,103 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+MODULES = ('backend.wsgi', 'backend.urls')
+# Бюджет холодного импорта модулей в миллисекундах.
+BUDGET_MS = 1000
+MARKER = '--- import start ---'
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+SCRIPT = '''
+import sys, time
+sys.stderr.write({marker!r} + '\\n')
+started = time.perf_counter()
+{imports}
+print(time.perf_counter() - started)
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Команда измеряет время холодного импорта модулей (по умолчанию '
+        'backend.wsgi и URLconf) в отдельном процессе с -X importtime, '
+        'показывает самые медленные модули и пакеты и завершается '
+        'ошибкой при превышении бюджета'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', default=MODULES)
+        parser.add_argument(
+            '--budget', type=float, default=BUDGET_MS,
+            help='Бюджет в миллисекундах.',
+        )
+        parser.add_argument(
+            '--rounds', type=int, default=3,
+            help='Число запусков, берётся самый быстрый.',
+        )
+        parser.add_argument('--top', type=int, default=15)
+
+    def measure(self, modules):
+        script = SCRIPT.format(
+            marker=MARKER,
+            imports='\n'.join(f'import {module}' for module in modules),
+        )
+        # Прогрев намеренно загружает тяжёлые зависимости, его время
+        # к импорту не относится.
+        env = {**os.environ, 'WARMUP_ON_LOAD': 'False'}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        records = []
+        started = False
+        for line in result.stderr.splitlines():
+            if line == MARKER:
+                started = True
+                continue
+            match = LINE.match(line)
+            if started and match:
+                own, cumulative, indent, name = match.groups()
+                records.append(
+                    (name, int(own) / 1000, int(cumulative) / 1000,
+                     len(indent) // 2)
+                )
+        return float(result.stdout.strip()) * 1000, records
+
+    def handle(self, *args, **options):
+        runs = [
+            self.measure(options['modules'])
+            for _ in range(options['rounds'])
+        ]
+        total, records = min(runs, key=lambda run: run[0])
+        packages = defaultdict(float)
+        for name, own, _, _ in records:
+            packages[name.split('.')[0]] += own
+        top = options['top']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Пакеты (собственное время, мс), модулей: {len(records)}'
+        ))
+        for name, own in sorted(
+            packages.items(), key=lambda item: -item[1]
+        )[:top]:
+            self.stdout.write(f'{own:9.1f}  {name}')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Модули (собственное / с зависимостями, мс)'
+        ))
+        for name, own, cumulative, _ in sorted(
+            records, key=lambda record: -record[1]
+        )[:top]:
+            self.stdout.write(f'{own:9.1f} {cumulative:9.1f}  {name}')
+        line = (
+            f'Импорт {", ".join(options["modules"])}: {total:.0f} мс, '
+            f'бюджет {options["budget"]:.0f} мс'
+        )
+        if total > options['budget']:
+            raise CommandError(line)
+        self.stdout.write(self.style.SUCCESS(line))
@@ -0,0 +1,138 @@
+import io
+import re
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.db.models import Q, Sum
+from django.test.runner import DiscoverRunner
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from api.sync import get_position
+from api.views import get_recipe_queryset
+from recipes.models import ChangeLog, Ingredient, Recipe, RecipeIngredient
+
+User = get_user_model()
+
+# Полный просмотр этих таблиц допустим: в них десятки строк.
+SMALL_TABLES = {'recipes_tag', 'django_content_type'}
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(?!CONSTANT\b)(\w+)\b(?! USING)'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Команда выполняет EXPLAIN основных запросов на тестовой БД с '
+        'данными generate_data и завершается ошибкой, если запрос читает '
+        'большую таблицу полным просмотром вместо индекса'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать планы всех запросов, а не только провальных.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQ_SCAN:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается.'
+            )
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            # Картинки сгенерированных рецептов не попадают в media.
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root):
+                self.seed(options['recipes'])
+            failures = self.check_plans(options['verbose_plans'])
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+        if failures:
+            raise CommandError(f'Полный просмотр таблиц в {failures} планах')
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы.'))
+
+    def seed(self, recipes):
+        call_command('add_data', stdout=io.StringIO())
+        call_command(
+            'generate_data', users=recipes // 10, recipes=recipes, seed=1,
+            prefix='plan', stdout=io.StringIO()
+        )
+        self.user = User.objects.filter(favorites__isnull=False).first()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def queries(self):
+        user = self.user
+        position = get_position(connection.alias)
+        queries = {
+            'recipes.list': get_recipe_queryset(user)[:6],
+            'recipes.list_favorited': get_recipe_queryset(user).filter(
+                favorites__user=user
+            )[:6],
+            'recipes.list_in_cart': get_recipe_queryset(user).filter(
+                shopping_cart__user=user
+            )[:6],
+            'recipes.list_by_author': Recipe.objects.filter(
+                author=user
+            )[:6],
+            'recipes.download_shopping_cart': RecipeIngredient.objects.filter(
+                recipe__shopping_cart__user=user
+            ).values(
+                'ingredient__name', 'ingredient__measurement_unit'
+            ).order_by('ingredient__name').annotate(
+                ingredient_value=Sum('amount')
+            ),
+            'users.subscriptions': User.objects.filter(
+                subscriptions__user=user
+            ).order_by(*User._meta.ordering)[:6],
+            'sync.changes': ChangeLog.objects.filter(
+                Q(user__isnull=True) | Q(user=user),
+                **{f'{position}__gte': 0, f'{position}__lt': 2**62}
+            ).order_by(position, 'id')[:settings.SYNC_BATCH_SIZE],
+        }
+        if connection.vendor == 'postgresql':
+            # В SQLite регистронезависимый LIKE не использует индексы.
+            queries['ingredients.search'] = Ingredient.objects.filter(
+                name__istartswith='аб'
+            )
+        return queries
+
+    def explain(self, queryset):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # Без последовательного просмотра планировщик выбирает индекс,
+        # если он вообще подходит, даже на маленькой тестовой таблице.
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            return queryset.explain()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+
+    def check_plans(self, verbose):
+        failures = 0
+        pattern = SEQ_SCAN[connection.vendor]
+        for name, queryset in self.queries().items():
+            plan = self.explain(queryset)
+            scanned = set(pattern.findall(plan)) - SMALL_TABLES
+            if scanned:
+                failures += 1
+                self.stdout.write(self.style.ERROR(
+                    f'FAIL {name:<34} полный просмотр: '
+                    f'{", ".join(sorted(scanned))}'
+                ))
+            else:
+                self.stdout.write(f'ok   {name}')
+            if scanned or verbose:
+                self.stdout.write(plan)
+        return failures
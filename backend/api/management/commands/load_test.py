@@ -0,0 +1,291 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management import BaseCommand, CommandError
+
+# Сценарии и веса повторяют основные сценарии postman_collection:
+# просмотр ленты и рецептов, поиск ингредиентов, избранное и корзина.
+SCENARIOS = {
+    'recipes_list': 30,
+    'recipes_by_tag': 8,
+    'recipes_by_author': 5,
+    'recipe_detail': 20,
+    'recipe_short_link': 4,
+    'tags_list': 5,
+    'ingredients_search': 8,
+    'users_list': 3,
+    'user_me': 3,
+    'subscriptions': 4,
+    'favorites_list': 4,
+    'favorite_toggle': 3,
+    'shopping_cart_toggle': 3,
+    'download_shopping_cart': 1,
+}
+AUTH_SCENARIOS = {
+    'user_me', 'subscriptions', 'favorites_list', 'favorite_toggle',
+    'shopping_cart_toggle', 'download_shopping_cart',
+}
+PREFIXES = 'абвгдежзиклмнопрстуфхцчшщэюя'
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class LoadRunner:
+    """Выполняет сценарии в потоках и копит время ответов."""
+
+    def __init__(self, base_url, tokens, recipe_ids, tags, author_ids,
+                 pages, seed):
+        self.base_url = base_url.rstrip('/')
+        self.pages = pages
+        self.tokens = tokens
+        self.recipe_ids = recipe_ids
+        self.tags = tags
+        self.author_ids = author_ids
+        self.seed = seed
+        self.lock = threading.Lock()
+
+    def run(self, concurrency, duration):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        deadline = time.monotonic() + duration
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            workers = [
+                executor.submit(self.worker, number, deadline)
+                for number in range(concurrency)
+            ]
+        for worker in workers:
+            # Ошибка в самом сценарии, а не в ответе сервера.
+            worker.result()
+        return time.monotonic() - started
+
+    def worker(self, number, deadline):
+        rng = random.Random(self.seed * 100003 + number)
+        session = requests.Session()
+        token = self.tokens[number % len(self.tokens)] if self.tokens else None
+        names = [
+            name for name in SCENARIOS
+            if token or name not in AUTH_SCENARIOS
+        ]
+        weights = [SCENARIOS[name] for name in names]
+        if token:
+            session.headers['Authorization'] = f'Token {token}'
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            for method, path, ok_statuses in self.requests_for(name, rng):
+                started = time.perf_counter()
+                try:
+                    status = session.request(
+                        method, self.base_url + path, timeout=30
+                    ).status_code
+                except Exception:
+                    # Таймаут, обрыв соединения или некорректный ответ
+                    # считаются ошибкой сценария, поток продолжает работу.
+                    status = None
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    self.latencies[name].append(elapsed)
+                    if status not in ok_statuses:
+                        self.errors[name] += 1
+
+    def requests_for(self, name, rng):
+        recipe_id = rng.choice(self.recipe_ids)
+        ok = (200,)
+        if name == 'recipes_list':
+            page = min(int(rng.paretovariate(1.5)), self.pages)
+            return [('GET', f'/api/recipes/?page={page}&limit=6', ok)]
+        if name == 'recipes_by_tag':
+            return [('GET', f'/api/recipes/?tags={rng.choice(self.tags)}', ok)]
+        if name == 'recipes_by_author':
+            author_id = rng.choice(self.author_ids)
+            return [('GET', f'/api/recipes/?author={author_id}', ok)]
+        if name == 'recipe_detail':
+            return [('GET', f'/api/recipes/{recipe_id}/', ok)]
+        if name == 'recipe_short_link':
+            return [('GET', f'/api/recipes/{recipe_id}/get-link/', ok)]
+        if name == 'tags_list':
+            return [('GET', '/api/tags/', ok)]
+        if name == 'ingredients_search':
+            prefix = rng.choice(PREFIXES)
+            return [('GET', f'/api/ingredients/?name={prefix}', ok)]
+        if name == 'users_list':
+            return [('GET', '/api/users/?limit=6', ok)]
+        if name == 'user_me':
+            return [('GET', '/api/users/me/', ok)]
+        if name == 'subscriptions':
+            return [('GET', '/api/users/subscriptions/?recipes_limit=3', ok)]
+        if name == 'favorites_list':
+            return [('GET', '/api/recipes/?is_favorited=1', ok)]
+        if name == 'download_shopping_cart':
+            return [('GET', '/api/recipes/download_shopping_cart/', ok)]
+        url = {
+            'favorite_toggle': f'/api/recipes/{recipe_id}/favorite/',
+            'shopping_cart_toggle': f'/api/recipes/{recipe_id}/shopping_cart/',
+        }[name]
+        # Добавление и удаление: 400 означает, что рецепт уже был в списке.
+        return [('POST', url, (201, 400)), ('DELETE', url, (204, 400))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Команда нагружает запущенный сервер взвешенными сценариями и '
+        'выводит пропускную способность и p50/p95/p99 по сценариям'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument(
+            '--concurrency', default='50',
+            help='Число одновременных клиентов, можно списком: 50,200,1000.',
+        )
+        parser.add_argument(
+            '--duration', type=int, default=30,
+            help='Длительность каждого прогона в секундах.',
+        )
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Сколько пользователей generate_data авторизовать.',
+        )
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--password', default='synthetic-password')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--save', help='Сохранить итоги прогонов в JSON-файл.',
+        )
+        parser.add_argument(
+            '--max-error-rate', type=float, default=0.01,
+            help='Допустимая доля ошибок в каждом сценарии; при превышении '
+                 'команда завершается с ошибкой.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON-файл прошлого прогона (--save) для сравнения, '
+                 'например WSGI против ASGI.',
+        )
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        tokens = self.login(base_url, options)
+        page = requests.get(
+            f'{base_url}/api/recipes/?limit=200', timeout=30
+        ).json()
+        recipes = page['results']
+        if not recipes:
+            raise CommandError('На сервере нет рецептов, см. generate_data.')
+        tags = [
+            tag['slug']
+            for tag in requests.get(f'{base_url}/api/tags/', timeout=30).json()
+        ]
+        runner = LoadRunner(
+            base_url,
+            tokens,
+            [recipe['id'] for recipe in recipes],
+            tags,
+            list({recipe['author']['id'] for recipe in recipes}),
+            max(1, -(-page['count'] // 6)),
+            options['seed'],
+        )
+        summary = {}
+        failed = []
+        for concurrency in map(int, options['concurrency'].split(',')):
+            elapsed = runner.run(concurrency, options['duration'])
+            summary[str(concurrency)] = self.report(
+                concurrency, elapsed, runner
+            )
+            failed.extend(
+                f'{name} при {concurrency} клиентах: '
+                f'{runner.errors[name] / len(values):.1%}'
+                for name, values in runner.latencies.items()
+                if runner.errors[name] / len(values)
+                > options['max_error_rate']
+            )
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(summary, file, indent=2)
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.compare(json.load(file), summary)
+        if failed:
+            raise CommandError(
+                'Доля ошибок выше допустимой: ' + ', '.join(failed)
+            )
+
+    def login(self, base_url, options):
+        tokens = []
+        for number in range(options['users']):
+            response = requests.post(
+                f'{base_url}/api/auth/token/login/',
+                json={
+                    'email': f'{options["prefix"]}{number}@foodgram.test',
+                    'password': options['password'],
+                },
+                timeout=30,
+            )
+            if response.status_code == 200:
+                tokens.append(response.json()['auth_token'])
+        if not tokens:
+            self.stderr.write(
+                'Не удалось авторизоваться, запускаются только '
+                'анонимные сценарии.'
+            )
+        return tokens
+
+    def report(self, concurrency, elapsed, runner):
+        total = sum(len(values) for values in runner.latencies.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'\nКлиентов: {concurrency}, запросов: {total}, '
+            f'{total / elapsed:.1f} запр/с'
+        ))
+        self.stdout.write(
+            f'{"сценарий":<24}{"запросов":>10}{"ошибок":>8}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}'
+        )
+        rows = []
+        for name, values in runner.latencies.items():
+            values.sort()
+            rows.append((
+                name, len(values), runner.errors[name],
+                *(percentile(values, share) * 1000
+                  for share in (0.5, 0.95, 0.99)),
+            ))
+        all_values = sorted(
+            value for values in runner.latencies.values() for value in values
+        )
+        rows.append((
+            'всего', total, sum(runner.errors.values()),
+            *(percentile(all_values, share) * 1000
+              for share in (0.5, 0.95, 0.99)),
+        ))
+        for name, count, errors, p50, p95, p99 in rows:
+            self.stdout.write(
+                f'{name:<24}{count:>10}{errors:>8}'
+                f'{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}'
+            )
+        _, _, errors, p50, p95, p99 = rows[-1]
+        return {
+            'rps': total / elapsed, 'errors': errors,
+            'p50': p50, 'p95': p95, 'p99': p99,
+        }
+
+    def compare(self, before, after):
+        self.stdout.write(self.style.SUCCESS('\nСравнение с прошлым прогоном'))
+        self.stdout.write(
+            f'{"клиентов":<10}{"запр/с":>18}{"p95, мс":>18}{"p99, мс":>18}'
+        )
+        for concurrency, current in after.items():
+            previous = before.get(concurrency)
+            if previous is None:
+                continue
+            self.stdout.write(f'{concurrency:<10}' + ''.join(
+                f'{previous[key]:>9.1f}{current[key]:>9.1f}'
+                for key in ('rps', 'p95', 'p99')
+            ))
@@ -0,0 +1,277 @@
+"""Метрики в текстовом формате Prometheus.
+
+Каждый процесс gunicorn копит значения в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл в METRICS_DIR.
+При сборе метрик файлы всех процессов суммируются. Файлы завершившихся
+процессов при сборе переносятся в общий архив и удаляются, поэтому их
+счётчики учитываются, а число файлов не растёт.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+ARCHIVE_NAME = 'archive.json'
+
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'Количество запросов.', None
+    ),
+    'foodgram_http_errors_total': (
+        'counter', 'Количество ответов с ошибкой сервера.', None
+    ),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.', LATENCY_BUCKETS
+    ),
+    'foodgram_db_queries_total': (
+        'counter', 'Количество SQL-запросов.', None
+    ),
+    'foodgram_db_queries_per_request': (
+        'histogram', 'Количество SQL-запросов на запрос.', QUERY_BUCKETS
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кешам по результату.', None
+    ),
+    'foodgram_throttled_total': (
+        'counter', 'Запросы, отклонённые ограничением частоты.', None
+    ),
+    'foodgram_pdf_generation_duration_seconds': (
+        'histogram', 'Время генерации PDF списка покупок.', LATENCY_BUCKETS
+    ),
+}
+
+
+class MetricsRegistry:
+    """Значения метрик текущего процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _check_process(self):
+        # После fork процесс начинает с нуля и пишет в свой файл.
+        pid = os.getpid()
+        if self._pid != pid:
+            self._path = os.path.join(
+                settings.METRICS_DIR, f'{pid}-{uuid.uuid4().hex}.json'
+            )
+            self._counters = defaultdict(float)
+            self._histograms = {}
+            self._flushed = time.monotonic()
+            self._pid = pid
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._check_process()
+            self._counters[key] += value
+        self.flush()
+
+    def observe(self, name, value, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        buckets = METRICS[name][2]
+        with self._lock:
+            self._check_process()
+            histogram = self._histograms.setdefault(
+                key, [[0] * len(buckets), 0.0, 0]
+            )
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+        self.flush()
+
+    def flush(self, force=False):
+        with self._lock:
+            self._check_process()
+            now = time.monotonic()
+            if not force and now - self._flushed < (
+                settings.METRICS_FLUSH_INTERVAL
+            ):
+                return
+            self._flushed = now
+            data = dump(self._counters, self._histograms)
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        write_file(self._path, data)
+
+    def archive_dead(self):
+        """Переносит в архив файлы завершившихся процессов."""
+        archive_path = os.path.join(settings.METRICS_DIR, ARCHIVE_NAME)
+        counters = defaultdict(float)
+        histograms = {}
+        dead = []
+        for entry in os.scandir(settings.METRICS_DIR):
+            pid, _, _ = entry.name.partition('-')
+            if (entry.name.endswith('.json') and pid.isdigit()
+                    and not is_alive(int(pid))):
+                data = read_file(entry.path)
+                if data is not None:
+                    merge(counters, histograms, data)
+                dead.append(entry.path)
+        if not dead:
+            return
+        archive = read_file(archive_path)
+        if archive is not None:
+            merge(counters, histograms, archive)
+        write_file(archive_path, dump(counters, histograms))
+        for path in dead:
+            os.remove(path)
+
+    def collect(self):
+        """Суммирует значения всех процессов."""
+        self.flush(force=True)
+        # Блокировка не даёт двум сборам перенести один файл дважды.
+        with open(os.path.join(settings.METRICS_DIR, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.archive_dead()
+            counters = defaultdict(float)
+            histograms = {}
+            for entry in os.scandir(settings.METRICS_DIR):
+                if not entry.name.endswith('.json'):
+                    continue
+                data = read_file(entry.path)
+                if data is not None:
+                    merge(counters, histograms, data)
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, histogram[0]):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket'
+                        f'{format_labels(labels, le=bound)} {cumulative}'
+                    )
+                lines.append(
+                    f'{name}_bucket'
+                    f'{format_labels(labels, le="+Inf")} {histogram[2]}'
+                )
+                lines.append(
+                    f'{name}_sum{format_labels(labels)} {histogram[1]}'
+                )
+                lines.append(
+                    f'{name}_count{format_labels(labels)} {histogram[2]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_file(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_file(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+def dump(counters, histograms):
+    return {
+        'counters': [
+            [name, labels, value]
+            for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, labels, *histogram]
+            for (name, labels), histogram in histograms.items()
+        ],
+    }
+
+
+def merge(counters, histograms, data):
+    """Добавляет значения из файла процесса к суммам."""
+    for name, labels, value in data['counters']:
+        counters[name, tuple(map(tuple, labels))] += value
+    for name, labels, buckets, total, count in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        histogram = histograms.setdefault(
+            key, [[0] * len(buckets), 0.0, 0]
+        )
+        histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+        histogram[1] += total
+        histogram[2] += count
+
+
+def format_labels(labels, **extra):
+    labels = (*labels, *extra.items())
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+                '\n', r'\n'
+            )
+        )
+        for key, value in labels
+    ) + '}'
+
+
+registry = MetricsRegistry()
+
+
+@atexit.register
+def flush_on_exit():
+    if registry._pid is not None:
+        registry.flush(force=True)
+
+
+def observe_request(recorder, request, response, duration):
+    labels = {
+        'view': recorder.view or 'unresolved',
+        'action': recorder.action or '',
+    }
+    registry.inc('foodgram_http_requests_total', {
+        **labels,
+        'method': request.method,
+        'status': str(response.status_code),
+    })
+    if response.status_code >= 500:
+        registry.inc('foodgram_http_errors_total', labels)
+    registry.observe(
+        'foodgram_http_request_duration_seconds', duration, labels
+    )
+    registry.inc('foodgram_db_queries_total', labels, recorder.queries)
+    registry.observe(
+        'foodgram_db_queries_per_request', recorder.queries, labels
+    )
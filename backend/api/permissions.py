@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import permissions
 
+from api.utils import get_client_ip, in_networks
+
 
 class AuthorPermission(permissions.IsAuthenticatedOrReadOnly):
     """Резрешение для автора, аут.пользователя или чтение."""
@@ -9,3 +12,12 @@ class AuthorPermission(permissions.IsAuthenticatedOrReadOnly):
             request.method in permissions.SAFE_METHODS
             or obj.author == request.user
         )
+
+
+class InternalOrStaffPermission(permissions.BasePermission):
+    """Разрешение для служебных адресов или персонала."""
+
+    def has_permission(self, request, view):
+        return request.user.is_staff or in_networks(
+            get_client_ip(request), tuple(settings.INTERNAL_NETWORKS)
+        )
@@ -0,0 +1,218 @@
+"""Профилирование отдельных запросов по запросу персонала.
+
+Запрос с заголовком X-Profile или параметром ?profile= выполняется под
+профилировщиком: sampling (по умолчанию) собирает стеки в свёрнутом
+формате flamegraph.pl/speedscope, cprofile сохраняет файл pstats.
+Последние PROFILE_KEEP профилей хранятся в PROFILE_DIR и доступны
+в админке по адресу /admin/profiles/. В режиме ASGI представление
+выполняется в другом потоке, поэтому там профилирование не работает.
+"""
+import asyncio
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+PROFILE_ID = re.compile(r'^\d+-[0-9a-f]{8}$')
+PROFILE_KINDS = {
+    '1': 'sampling',
+    'sampling': 'sampling',
+    'cprofile': 'cprofile',
+}
+EXTENSIONS = {'sampling': 'folded', 'cprofile': 'prof'}
+
+
+@lru_cache(maxsize=None)
+def code_name(code):
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Снимает стек профилируемого потока из отдельного потока."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(code_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+        return sum(self.stacks.values())
+
+
+class CProfiler:
+    """Детерминированный профилировщик cProfile."""
+
+    def __enter__(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+        return len(self.profile.getstats())
+
+
+def get_profiles():
+    """Метаданные сохранённых профилей, новые первыми."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.PROFILE_DIR, name)) as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def store_profile(profiler, meta):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profile_id = f'{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}'
+    filename = f'{profile_id}.{EXTENSIONS[meta["kind"]]}'
+    meta.update(
+        id=profile_id,
+        filename=filename,
+        samples=profiler.save(os.path.join(settings.PROFILE_DIR, filename)),
+    )
+    with open(os.path.join(settings.PROFILE_DIR, f'{profile_id}.json'),
+              'w') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    for stale in get_profiles()[settings.PROFILE_KEEP:]:
+        for name in (stale['filename'], f'{stale["id"]}.json'):
+            try:
+                os.remove(os.path.join(settings.PROFILE_DIR, name))
+            except FileNotFoundError:
+                pass
+    return profile_id
+
+
+class ProfilingMiddleware:
+    """Запускает запрос персонала под профилировщиком."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.get_response(request)
+        kind = PROFILE_KINDS.get(
+            request.headers.get('X-Profile')
+            or request.GET.get('profile', '')
+        )
+        if kind is None or not self.is_staff(request):
+            return self.get_response(request)
+        if kind == 'sampling':
+            profiler = SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL)
+        else:
+            profiler = CProfiler()
+        started = time.perf_counter()
+        with profiler:
+            response = self.get_response(request)
+        profile_id = store_profile(profiler, {
+            'kind': kind,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': str(request.user),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def is_staff(self, request):
+        if request.user.is_authenticated:
+            return request.user.is_staff
+        drf_request = Request(
+            request,
+            authenticators=[
+                authentication()
+                for authentication
+                in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            ]
+        )
+        try:
+            return drf_request.user.is_staff
+        except APIException:
+            return False
+
+
+def profile_list(request):
+    """Страница админки со списком последних профилей."""
+    return TemplateResponse(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': get_profiles(),
+    })
+
+
+def profile_download(request, profile_id):
+    """Скачивание файла профиля."""
+    if not PROFILE_ID.match(profile_id):
+        raise Http404
+    for profile in get_profiles():
+        if profile['id'] == profile_id:
+            return FileResponse(
+                open(os.path.join(
+                    settings.PROFILE_DIR, profile['filename']
+                ), 'rb'),
+                as_attachment=True,
+                filename=profile['filename'],
+            )
+    raise Http404
@@ -0,0 +1,63 @@
+"""JSON-рендерер и парсер на orjson.
+
+orjson кодирует ответы в несколько раз быстрее стандартного json. Если
+пакет не установлен или нужен формат, который orjson не поддерживает
+(отступ, отличный от двух пробелов, ASCII-вывод, разделители с
+пробелами, кодировка не UTF-8), работают стандартные классы DRF. Даты,
+Decimal и ленивые строки кодируются JSONEncoder DRF, а U+2028 и U+2029
+экранируются, как у JSONRenderer, поэтому ответы побайтно совпадают.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+OPTIONS = orjson and (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+)
+# Разделители строк JavaScript, которые JSONRenderer экранирует.
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Рендерер application/json на orjson."""
+
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent not in (None, 2) or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        options = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+        content = orjson.dumps(data, default=self.encoder.default,
+                               option=options)
+        for separator, escaped in LINE_SEPARATORS:
+            content = content.replace(separator, escaped)
+        return content
+
+
+class ORJSONParser(JSONParser):
+    """Парсер application/json на orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from api.fields import Base64ImageField
+from api.fields import Base64ImageField, PrimaryKeyField
+from api.instrumentation import InstrumentedSerializerMixin
+from api.utils import get_request_cache
 from recipes.models import (Favorites, Ingredient,
                             Recipe,
                             RecipeIngredient,
@@ -13,9 +16,71 @@ from users.models import Subscriptions
 
 
 User = get_user_model()
+DOES_NOT_EXIST = serializers.PrimaryKeyRelatedField.default_error_messages[
+    'does_not_exist'
+]
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_subscribed_ids(request):
+    """Id авторов, на которых подписан пользователь.
+
+    Загружаются одним запросом и запоминаются на время запроса.
+    """
+    cache = get_request_cache(request)
+    if 'subscribed_ids' not in cache:
+        cache['subscribed_ids'] = set(
+            Subscriptions.objects.filter(user=request.user).values_list(
+                'author_id', flat=True
+            )
+        )
+    return cache['subscribed_ids']
+
+
+def prefetched(manager, objects):
+    """Queryset связи с уже известными объектами, как после prefetch."""
+    queryset = manager.get_queryset()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    return queryset
+
+
+def split_param(request, name):
+    value = request.query_params.get(name) if request else None
+    if not value:
+        return None
+    return {field.strip() for field in value.split(',') if field.strip()}
+
+
+def get_requested_fields(request, fields):
+    """Поля ответа с учётом параметров запроса ?fields= и ?omit=."""
+    only = split_param(request, 'fields')
+    omit = split_param(request, 'omit') or set()
+    return [
+        field for field in fields
+        if (only is None or field in only) and field not in omit
+    ]
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе поля из ?fields= без полей из ?omit=.
+
+    Действует только на корневой сериализатор ответа, вложенные
+    сериализаторы отдают все свои поля.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        requested = get_requested_fields(self.context.get('request'), fields)
+        return {name: fields[name] for name in requested}
+
+
+class UserSerializer(SparseFieldsMixin, InstrumentedSerializerMixin,
+                     serializers.ModelSerializer):
     """Сериализатор модели User."""
     is_subscribed = serializers.SerializerMethodField(default=False)
     avatar = Base64ImageField(required=False, allow_null=True)
@@ -34,11 +99,11 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        return request and (
-            request.user.is_authenticated and Subscriptions.objects.filter(
-                user=request.user.id,
-                author=obj
-            ).exists()
+        # На себя подписаться нельзя, подписки для этого не загружаются.
+        return bool(request) and (
+            request.user.is_authenticated
+            and obj.id != request.user.id
+            and obj.id in get_subscribed_ids(request)
         )
 
 
@@ -51,7 +116,8 @@ class AvatarSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(InstrumentedSerializerMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для ингредиентов."""
 
     class Meta:
@@ -59,7 +125,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(InstrumentedSerializerMixin,
+                    serializers.ModelSerializer):
     """Сериализатор для тегов."""
 
     class Meta:
@@ -69,7 +136,8 @@ class TagSerializer(serializers.ModelSerializer):
 
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для записи ингредиентов рецепта."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Существование ингредиентов проверяет RecipeSerializer одним запросом.
+    id = PrimaryKeyField(queryset=Ingredient.objects.all())
 
     class Meta:
         model = RecipeIngredient
@@ -89,7 +157,8 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, InstrumentedSerializerMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для чтения рецепта."""
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer()
@@ -116,28 +185,33 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
-        return request and (
+        return bool(request) and (
             request.user.is_authenticated and obj.favorites.filter(
-                user=request.user.id, recipe=obj
+                user=request.user.id
             ).exists()
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
-        return request and (
+        return bool(request) and (
             request.user.is_authenticated and obj.shopping_cart.filter(
-                user=request.user.id, recipe=obj
+                user=request.user.id
             ).exists()
         )
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор для рецептов."""
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
-    )
+    """Сериализатор для рецептов.
+
+    Теги и ингредиенты проверяются одним запросом на таблицу, а ответ
+    на запись собирается из сохранённых объектов без повторного чтения.
+    """
+    tags = PrimaryKeyField(queryset=Tag.objects.all(), many=True)
     ingredients = RecipeIngredientWriteSerializer(many=True)
     image = Base64ImageField()
 
@@ -153,6 +227,35 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('author',)
 
+    saved_relations = None
+
+    def validate_tags(self, value):
+        # Порядок Tag.Meta.ordering, как при чтении рецепта; повторы
+        # остаются для проверки в validate().
+        tags = {tag.id: tag for tag in Tag.objects.filter(id__in=value)}
+        for pk in value:
+            if pk not in tags:
+                raise serializers.ValidationError(
+                    DOES_NOT_EXIST.format(pk_value=pk)
+                )
+        order = {pk: position for position, pk in enumerate(tags)}
+        return sorted(
+            (tags[pk] for pk in value), key=lambda tag: order[tag.id]
+        )
+
+    def validate_ingredients(self, value):
+        ingredients = Ingredient.objects.in_bulk(
+            {item['id'] for item in value}
+        )
+        errors = [
+            {} if item['id'] in ingredients
+            else {'id': [DOES_NOT_EXIST.format(pk_value=item['id'])]}
+            for item in value
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [{**item, 'id': ingredients[item['id']]} for item in value]
+
     def validate(self, data):
         ingredients = data.get('ingredients')
         if not ingredients:
@@ -175,12 +278,21 @@ class RecipeSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
+        if self.saved_relations is not None:
+            # Кеш связей заполняется здесь, а не в create() и update():
+            # UpdateModelMixin сбрасывает его после сохранения.
+            instance._prefetched_objects_cache = {}
+            cache = {
+                name: prefetched(getattr(instance, name), objects)
+                for name, objects in self.saved_relations.items()
+            }
+            instance._prefetched_objects_cache = cache
         context = {'request': self.context.get('request')}
         serializer = RecipeReadSerializer(instance, context=context)
         return serializer.data
 
-    def create_ingredient(self, recipe, ingredients):
-        return RecipeIngredient.objects.bulk_create(
+    def create_relations(self, recipe, ingredients, tags):
+        recipe_ingredients = RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=recipe,
                 ingredient=ing['id'],
@@ -188,6 +300,13 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
             for ing in ingredients
         )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag) for tag in tags
+        )
+        self.saved_relations = {
+            'tags': tags,
+            'recipe_ingredients': recipe_ingredients,
+        }
 
     @transaction.atomic
     def create(self, validated_data):
@@ -197,21 +316,23 @@ class RecipeSerializer(serializers.ModelSerializer):
             author=self.context.get('request').user,
             **validated_data
         )
-        self.create_ingredient(recipe, ingredients)
-        recipe.tags.set(tags)
+        self.create_relations(recipe, ingredients, tags)
+        # Новый рецепт ещё никто не добавил в избранное и в покупки.
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        self.create_ingredient(instance, ingredients)
         tags = validated_data.pop('tags')
-        instance.tags.set(tags)
+        instance.ingredients.clear()
+        instance.tags.clear()
+        self.create_relations(instance, ingredients, tags)
         return super().update(instance, validated_data)
 
 
-class ShortRecipesSerializer(serializers.ModelSerializer):
+class ShortRecipesSerializer(InstrumentedSerializerMixin,
+                             serializers.ModelSerializer):
     """Сериализатор для рецептов краткий."""
     image = Base64ImageField()
 
@@ -268,17 +389,18 @@ class SubscriptionsSerializer(UserSerializer):
             'avatar'
         )
 
+    @staticmethod
+    def get_recipes_limit(request):
+        try:
+            return int(request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-                recipes = obj.recipes.all()[:recipes_limit]
-            except ValueError:
-                pass
-        else:
-            recipes = obj.recipes.all()
+        recipes = obj.recipes.all()
+        recipes_limit = self.get_recipes_limit(self.context.get('request'))
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
         return ShortRecipesSerializer(
             recipes,
             many=True,
@@ -286,6 +408,8 @@ class SubscriptionsSerializer(UserSerializer):
         ).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
@@ -317,3 +441,31 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
                 message='Вы уже добавили этот рецепт.'
             )
         ]
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """Сериализатор подзапроса пакета."""
+    method = serializers.ChoiceField(
+        choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+    )
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False, allow_null=True)
+
+    def validate_path(self, value):
+        if not value.startswith('/api/') or value.startswith('/api/batch/'):
+            raise serializers.ValidationError(
+                'Поддерживаются только пути /api/, кроме /api/batch/.'
+            )
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """Сериализатор пакета запросов."""
+    requests = BatchRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f'Не больше {settings.BATCH_MAX_REQUESTS} запросов в пакете.'
+            )
+        return value
@@ -0,0 +1,100 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import CachedTokenAuthentication
+from api.instrumentation import install_query_recorder
+from api.sync import MODEL_KINDS, record_change
+from backend.cache import invalidate
+from recipes.models import (ChangeLog, Favorites, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(CachedTokenAuthentication.invalidate, instance.key)
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields,
+                           **kwargs):
+    # Вход по токену сохраняет last_login, кеш от этого не устаревает.
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    keys = list(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+    transaction.on_commit(
+        partial(CachedTokenAuthentication.invalidate, *keys)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(partial(invalidate, sender._meta.label_lower))
+
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_saved(sender, instance, **kwargs):
+    record_change(
+        ChangeLog.RECIPE, instance.id, author_id=instance.author_id
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_deleted(sender, instance, **kwargs):
+    record_change(
+        ChangeLog.RECIPE, instance.id, ChangeLog.DELETE,
+        author_id=instance.author_id
+    )
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_save, sender=ShoppingCart)
+def log_user_recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        record_change(
+            MODEL_KINDS[sender], instance.recipe_id, user_id=instance.user_id
+        )
+
+
+@receiver(post_delete, sender=Favorites)
+@receiver(post_delete, sender=ShoppingCart)
+def log_user_recipe_deleted(sender, instance, **kwargs):
+    record_change(
+        MODEL_KINDS[sender], instance.recipe_id, ChangeLog.DELETE,
+        instance.user_id
+    )
+
+
+@receiver(post_save, sender=Subscriptions)
+def log_subscription_saved(sender, instance, created, **kwargs):
+    if created:
+        record_change(
+            ChangeLog.SUBSCRIPTION, instance.author_id,
+            user_id=instance.user_id
+        )
+
+
+@receiver(post_delete, sender=Subscriptions)
+def log_subscription_deleted(sender, instance, **kwargs):
+    record_change(
+        ChangeLog.SUBSCRIPTION, instance.author_id, ChangeLog.DELETE,
+        instance.user_id
+    )
+
+
+connection_created.connect(install_query_recorder)
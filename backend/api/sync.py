@@ -0,0 +1,148 @@
+"""Дельта-синхронизация по журналу изменений.
+
+Изменения записываются в ChangeLog сигналами моделей (api/signals.py)
+в той же транзакции, что и сами данные, поэтому в журнал попадают и
+каскадные удаления, и правки из админки. Клиент без курсора получает
+текущий курсор, загружает полное состояние обычными эндпоинтами и
+дальше запрашивает только изменения.
+
+Курсор — позиция в порядке фиксации: клиент получил все записи с
+меньшей позицией. Id выдаются при вставке, а транзакции фиксируются в
+другом порядке, поэтому на PostgreSQL позиция — txid транзакции,
+записавшей изменение. Отдаются только записи транзакций с txid меньше
+xmin текущего снимка: все они уже завершены, а новые получат txid не
+меньше него. Так порядок фиксации не требует общей блокировки, и
+записи не ждут друг друга. SQLite допускает одну пишущую транзакцию,
+там позиция — id записи.
+"""
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Max, Min, Q
+from django.db.models.expressions import RawSQL
+
+from recipes.models import ChangeLog, Favorites, ShoppingCart
+
+MODEL_KINDS = {
+    Favorites: ChangeLog.FAVORITE,
+    ShoppingCart: ChangeLog.SHOPPING_CART,
+}
+
+
+class CursorExpired(Exception):
+    """Записи после курсора удалены при очистке журнала."""
+
+
+def record_change(kind, object_id, op=ChangeLog.UPSERT, user_id=None,
+                  author_id=None):
+    """Запись в журнал, вызывается внутри транзакции изменения."""
+    txid = None
+    if connections[router.db_for_write(ChangeLog)].vendor == 'postgresql':
+        txid = RawSQL('txid_current()', ())
+    return ChangeLog.objects.create(
+        kind=kind, object_id=object_id, op=op, user_id=user_id,
+        author_id=author_id, txid=txid
+    )
+
+
+def get_position(using):
+    """Поле позиции записей журнала в базе using."""
+    if connections[using].vendor == 'postgresql':
+        return 'txid'
+    return 'id'
+
+
+def get_horizon(using):
+    """Позиция, до которой все транзакции PostgreSQL завершены."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+
+
+def read_entries(entries, position, since, upper, limit, fields):
+    """Записи с позициями от since до upper целыми транзакциями.
+
+    Возвращает (записи, новый курсор, есть ли ещё); первое поле каждой
+    записи — позиция.
+    """
+    batch = list(
+        entries.filter(**{
+            f'{position}__gte': since, f'{position}__lt': upper
+        })
+        .order_by(position, 'id')
+        .values_list(position, *fields)[:limit + 1]
+    )
+    if len(batch) <= limit:
+        return batch, max(since, upper), False
+    # Курсор не может указывать внутрь транзакции: пачка обрывается
+    # перед транзакцией, не поместившейся целиком, а транзакция больше
+    # пачки отдаётся одна.
+    cutoff = batch[limit][0]
+    batch = [entry for entry in batch[:limit] if entry[0] < cutoff]
+    if batch:
+        return batch, cutoff, True
+    batch = list(
+        entries.filter(**{position: cutoff})
+        .order_by('id')
+        .values_list(position, *fields)
+    )
+    return batch, cutoff + 1, True
+
+
+def get_changes(user, since, limit=None):
+    """Сжатая пачка изменений после курсора.
+
+    Возвращает (изменения, новый курсор, есть ли ещё), где изменения —
+    словарь kind -> {'upserts': [id], 'deletes': [id]}; для одного
+    объекта остаётся только последняя операция.
+    """
+    limit = limit or settings.SYNC_BATCH_SIZE
+    using = router.db_for_read(ChangeLog)
+    position = get_position(using)
+    if position == 'txid':
+        upper = get_horizon(using)
+    log = ChangeLog.objects.using(using)
+    # Очистка удаляет только начало журнала и никогда не удаляет
+    # первую запись при сжатии дубликатов. Id выдаются с единицы,
+    # поэтому первая запись с большим id означает удалённое начало, и
+    # курсор до первой оставшейся позиции мог пропустить изменения.
+    bounds = log.aggregate(
+        first_id=Min('id'), first=Min(position), last=Max('id')
+    )
+    if (bounds['first_id'] is not None and bounds['first_id'] > 1
+            and since < bounds['first']):
+        raise CursorExpired
+    if position == 'id':
+        upper = (bounds['last'] or 0) + 1
+    visible = Q(user__isnull=True)
+    if user.is_authenticated:
+        visible |= Q(user=user)
+    entries, cursor, has_more = read_entries(
+        log.filter(visible), position, since, upper, limit,
+        ('kind', 'object_id', 'op')
+    )
+    latest = {}
+    for _, kind, object_id, op in entries:
+        latest[kind, object_id] = op
+    changes = {
+        kind: {'upserts': [], 'deletes': []}
+        for kind, _ in ChangeLog.KINDS
+        if kind == ChangeLog.RECIPE or user.is_authenticated
+    }
+    for (kind, object_id), op in latest.items():
+        key = 'upserts' if op == ChangeLog.UPSERT else 'deletes'
+        changes[kind][key].append(object_id)
+    return changes, cursor, has_more
+
+
+def get_upper(using):
+    """Позиция, до которой записи журнала можно отдавать клиентам."""
+    if get_position(using) == 'txid':
+        return get_horizon(using)
+    return (
+        ChangeLog.objects.using(using).aggregate(last=Max('id'))['last']
+        or 0
+    ) + 1
+
+
+def current_cursor():
+    return get_upper(router.db_for_read(ChangeLog))
@@ -0,0 +1,28 @@
+"""Общие настройки и данные тестов API."""
+from django.test import override_settings
+
+from recipes.models import Recipe
+from users.models import User
+
+# Кеш процесса: тесты не зависят от общего кеша и друг от друга.
+local_caches = override_settings(CACHES={
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    for alias in ('default', 'throttle')
+})
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='x'
+    )
+
+
+def create_recipe(author, **fields):
+    return Recipe.objects.create(**{
+        'author': author,
+        'name': 'Рецепт',
+        'text': 'Текст',
+        'image': 'recipes/images/recipe.png',
+        'cooking_time': 5,
+        **fields,
+    })
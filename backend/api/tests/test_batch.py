@@ -0,0 +1,54 @@
+from unittest import mock
+
+from rest_framework.test import APITestCase
+
+from api.tests.base import create_recipe, create_user, local_caches
+from api.views import RecipeViewSet
+from recipes.models import Favorites
+
+
+@local_caches
+class BatchTest(APITestCase):
+    """Ошибки подзапросов пакета."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('batch')
+        cls.recipe = create_recipe(cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def batch(self, *requests):
+        response = self.client.post(
+            '/api/batch/', {'requests': list(requests)}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [sub_response['status']
+                for sub_response in response.data['responses']]
+
+    def test_exception_does_not_abort_batch(self):
+        path = f'/api/recipes/{self.recipe.id}/get-link/'
+        with mock.patch.object(
+            RecipeViewSet, 'get_short_link', side_effect=RuntimeError
+        ), self.assertLogs('api.batch', 'ERROR'):
+            statuses = self.batch(
+                {'method': 'GET', 'path': path},
+                {'method': 'GET', 'path': '/api/tags/'},
+            )
+        self.assertEqual(statuses, [500, 200])
+
+    def test_failed_write_is_rolled_back(self):
+        path = f'/api/recipes/{self.recipe.id}/favorite/'
+        with mock.patch(
+            'api.views.ShortRecipesSerializer', side_effect=RuntimeError
+        ), self.assertLogs('api.batch', 'ERROR'):
+            statuses = self.batch({'method': 'POST', 'path': path})
+        self.assertEqual(statuses, [500])
+        self.assertFalse(Favorites.objects.exists())
+
+    def test_non_json_endpoint_is_rejected(self):
+        statuses = self.batch({
+            'method': 'GET', 'path': '/api/recipes/download_shopping_cart/'
+        })
+        self.assertEqual(statuses, [406])
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from backend.db_router import (ReplicaPool, ReplicaRouter,
+                               ReplicaRoutingMiddleware)
+from api.tests.base import create_user, local_caches
+from recipes.models import Recipe
+
+REPLICA = 'replica1'
+
+
+@local_caches
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_STICKY_SECONDS=60)
+@mock.patch.object(ReplicaPool, 'check', return_value=True)
+class ReplicaRoutingTest(TestCase):
+    """Выбор БД для чтения: основная и одна реплика."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.read_aliases = []
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+
+    def view(self, request):
+        self.read_aliases.append(ReplicaRouter().db_for_read(Recipe))
+        if getattr(request, 'login_as', None):
+            request.user = request.login_as
+        return HttpResponse()
+
+    def request(self, method, ip='10.0.0.1', token=None, login_as=None):
+        headers = {'REMOTE_ADDR': ip}
+        if token:
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        request = getattr(self.factory, method)('/api/recipes/', **headers)
+        request.login_as = login_as
+        self.middleware(request)
+        return self.read_aliases[-1]
+
+    def test_reads_go_to_replica(self, check):
+        self.assertEqual(self.request('get'), REPLICA)
+        self.assertEqual(self.request('get', token=self.token), REPLICA)
+
+    def test_writes_go_to_primary(self, check):
+        self.assertEqual(self.request('post'), DEFAULT_DB_ALIAS)
+
+    def test_reads_after_write_stick_to_primary(self, check):
+        self.request('post', ip='10.0.0.2')
+        self.assertEqual(self.request('get', ip='10.0.0.2'), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.request('get', ip='10.0.0.3'), REPLICA)
+
+    def test_user_sticks_from_another_address(self, check):
+        self.request(
+            'post', ip='10.0.0.4', token=self.token, login_as=self.user
+        )
+        self.assertEqual(
+            self.request('get', ip='10.0.0.5', token=self.token),
+            DEFAULT_DB_ALIAS
+        )
+
+    def test_reads_after_login_stick_to_primary(self, check):
+        # Вход — запрос без токена, следующие запросы уже с токеном.
+        self.request('post', ip='10.0.0.6')
+        self.assertEqual(
+            self.request('get', ip='10.0.0.6', token=self.token),
+            DEFAULT_DB_ALIAS
+        )
+
+    def test_failed_replica_is_skipped(self, check):
+        self.middleware.pool.mark_unhealthy(REPLICA)
+        self.assertEqual(self.request('get'), DEFAULT_DB_ALIAS)
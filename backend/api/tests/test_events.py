@@ -0,0 +1,21 @@
+from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.events import issue_ticket, use_ticket
+from api.tests.base import create_user, local_caches
+
+
+@local_caches
+class TicketTest(TestCase):
+    """Билет для EventSource принимается один раз."""
+
+    def test_ticket_is_single_use(self):
+        user = create_user('listener')
+        ticket = issue_ticket(user)
+        self.assertEqual(use_ticket(ticket), user.id)
+        with self.assertRaises(AuthenticationFailed):
+            use_ticket(ticket)
+
+    def test_forged_ticket(self):
+        with self.assertRaises(AuthenticationFailed):
+            use_ticket('forged')
@@ -0,0 +1,53 @@
+import base64
+import io
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.fields import Base64ImageField
+
+
+def image_bytes(image_format):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (200, 100, 50)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def data_url(content, ext):
+    return f'data:image/{ext};base64,' + base64.b64encode(content).decode()
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Декодирование и проверки поля изображения."""
+
+    def test_base64_with_line_breaks(self):
+        encoded = base64.encodebytes(
+            image_bytes('PNG') + b'\x00' * 300000
+        ).decode()
+        image = Base64ImageField().to_internal_value(
+            'data:image/png;base64,' + encoded
+        )
+        self.assertEqual(image.read(8), b'\x89PNG\r\n\x1a\n')
+
+    def test_riff_without_webp_is_rejected(self):
+        with self.assertRaisesMessage(
+            ValidationError, 'Недопустимый формат изображения.'
+        ):
+            Base64ImageField().to_internal_value(
+                data_url(b'RIFF\x00\x00\x00\x00WAVEfmt ', 'webp')
+            )
+
+    @override_settings(IMAGE_MAX_SIZE=100)
+    def test_size_limit(self):
+        content = image_bytes('PNG') + b'\x00' * 100
+        for data in (
+            data_url(content, 'png'),
+            SimpleUploadedFile('image.png', content, 'image/png'),
+        ):
+            with self.subTest(type=type(data).__name__):
+                with self.assertRaisesMessage(
+                    ValidationError, 'Размер изображения превышает 100 байт.'
+                ):
+                    Base64ImageField().to_internal_value(data)
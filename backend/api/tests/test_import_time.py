@@ -0,0 +1,25 @@
+from django.test import SimpleTestCase
+
+from api.management.commands.check_import_time import (BUDGET_MS, MODULES,
+                                                       Command)
+
+ROUNDS = 3
+TOP = 5
+
+
+class ImportTimeTest(SimpleTestCase):
+    """Холодный импорт WSGI-приложения укладывается в бюджет."""
+
+    def test_import_time(self):
+        total, records = min(
+            (Command().measure(MODULES) for _ in range(ROUNDS)),
+            key=lambda run: run[0]
+        )
+        slowest = ', '.join(
+            f'{name} {own:.0f} мс' for name, own, _, _ in sorted(
+                records, key=lambda record: -record[1]
+            )[:TOP]
+        )
+        self.assertLessEqual(
+            total, BUDGET_MS, f'Самые медленные модули: {slowest}'
+        )
@@ -0,0 +1,231 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from api.tests.base import local_caches
+from recipes.models import Favorites, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscriptions
+
+User = get_user_model()
+
+PAGE_SIZES = (2, 10)
+LABELS = {False: 'anon', True: 'user', 'admin': 'admin'}
+
+# Число SQL-запросов эндпоинтов: (название, метод, путь, авторизация,
+# запросов, постраничный ответ, ожидаемый статус). Авторизация: False —
+# аноним, True — пользователь API, 'admin' — суперпользователь в админке.
+# Постраничные ответы проверяются для каждого размера страницы: число
+# запросов не должно от него зависеть. Числа сняты на SQLite, как в CI;
+# на PostgreSQL /api/sync/ добавляет запрос горизонта снимка.
+BUDGETS = (
+    ('tags.list', 'get', '/api/tags/', False, 1, False, 200),
+    ('tags.retrieve', 'get', '/api/tags/{tag}/', False, 1, False, 200),
+    ('ingredients.list', 'get', '/api/ingredients/?name=аб', False, 1,
+     False, 200),
+    ('ingredients.retrieve', 'get', '/api/ingredients/{ingredient}/', False,
+     1, False, 200),
+    ('recipes.list', 'get', '/api/recipes/', False, 4, True, 200),
+    ('recipes.list', 'get', '/api/recipes/', True, 5, True, 200),
+    ('recipes.list_by_tags', 'get', '/api/recipes/?tags={tag_slug}', True,
+     6, True, 200),
+    ('recipes.list_sparse', 'get',
+     '/api/recipes/?fields=id,name,image,cooking_time,author,is_favorited',
+     True, 3, True, 200),
+    ('recipes.list_sparse', 'get', '/api/recipes/?fields=id,name', True, 2,
+     True, 200),
+    ('recipes.list_favorited', 'get', '/api/recipes/?is_favorited=1', True,
+     5, True, 200),
+    ('recipes.list_in_cart', 'get', '/api/recipes/?is_in_shopping_cart=1',
+     True, 5, True, 200),
+    ('recipes.retrieve', 'get', '/api/recipes/{recipe}/', False, 3, False,
+     200),
+    ('recipes.retrieve', 'get', '/api/recipes/{recipe}/', True, 4, False,
+     200),
+    ('recipes.get_short_link', 'get', '/api/recipes/{recipe}/get-link/',
+     False, 1, False, 200),
+    ('recipes.download_shopping_cart', 'get',
+     '/api/recipes/download_shopping_cart/', True, 1, False, 200),
+    ('recipes.create', 'post', '/api/recipes/', True, 7, False, 201),
+    ('recipes.partial_update', 'patch', '/api/recipes/{own_recipe}/', True,
+     10, False, 200),
+    ('recipes.favorite', 'post', '/api/recipes/{recipe}/favorite/', True, 7,
+     False, 201),
+    ('recipes.del_favorite', 'delete', '/api/recipes/{recipe}/favorite/',
+     True, 5, False, 204),
+    ('recipes.shopping_cart', 'post', '/api/recipes/{recipe}/shopping_cart/',
+     True, 7, False, 201),
+    ('recipes.del_shopping_cart', 'delete',
+     '/api/recipes/{recipe}/shopping_cart/', True, 5, False, 204),
+    ('recipes.destroy', 'delete', '/api/recipes/{own_recipe}/', True, 10,
+     False, 204),
+    ('users.list', 'get', '/api/users/', False, 2, True, 200),
+    ('users.list', 'get', '/api/users/', True, 3, True, 200),
+    ('users.list_sparse', 'get', '/api/users/?fields=id,username', True, 2,
+     True, 200),
+    ('users.retrieve', 'get', '/api/users/{author}/', True, 2, False, 200),
+    # force_authenticate: пользователь уже загружен.
+    ('users.me', 'get', '/api/users/me/', True, 0, False, 200),
+    ('users.subscriptions', 'get', '/api/users/subscriptions/', True, 4,
+     True, 200),
+    ('users.subscriptions_limited', 'get',
+     '/api/users/subscriptions/?recipes_limit=2', True, 4, True, 200),
+    ('users.subscribe', 'post', '/api/users/{author}/subscribe/', True, 10,
+     False, 201),
+    ('users.unsubscribe', 'delete', '/api/users/{author}/subscribe/', True,
+     5, False, 204),
+    ('users.avatar', 'put', '/api/users/me/avatar/', True, 2, False, 200),
+    ('users.delete_avatar', 'delete', '/api/users/me/avatar/', True, 2,
+     False, 204),
+    # Страница рецепта: рецепт, автор, теги и короткая ссылка.
+    ('batch', 'post', '/api/batch/', True, 6, False, 200),
+    ('sync.cursor', 'get', '/api/sync/', False, 1, False, 200),
+    ('sync', 'get', '/api/sync/?since=0', False, 2, False, 200),
+    ('sync', 'get', '/api/sync/?since=0', True, 2, False, 200),
+    ('admin.recipes', 'get', '/admin/recipes/recipe/', 'admin', 5, False,
+     200),
+    ('admin.recipes_search', 'get', '/admin/recipes/recipe/?q=budget1',
+     'admin', 5, False, 200),
+    ('admin.recipes_by_tag', 'get',
+     '/admin/recipes/recipe/?tags__id__exact={tag}', 'admin', 5, False,
+     200),
+    # Виджет автодополнения загружает выбранный ингредиент для каждой
+    # строки рецепта, в рецепте {recipe} их пять.
+    ('admin.recipe_change', 'get', '/admin/recipes/recipe/{recipe}/change/',
+     'admin', 14, False, 200),
+    ('admin.ingredients', 'get', '/admin/recipes/ingredient/', 'admin', 4,
+     False, 200),
+    ('admin.ingredient_autocomplete', 'get',
+     '/admin/autocomplete/?app_label=recipes&model_name=recipeingredient'
+     '&field_name=ingredient&term=аб', 'admin', 4, False, 200),
+    ('admin.users', 'get', '/admin/users/user/', 'admin', 5, False, 200),
+)
+
+
+def png_data_url():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (200, 100, 50)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@local_caches
+class QueryBudgetTest(APITransactionTestCase):
+    """Число SQL-запросов эндпоинтов API и админки.
+
+    Без обёртки TestCase в транзакцию: иначе transaction.atomic() в
+    представлениях добавляет в подсчёт точки сохранения.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        call_command('add_data', stdout=io.StringIO())
+        call_command(
+            'generate_data', users=40, recipes=200, seed=1, prefix='budget',
+            stdout=io.StringIO()
+        )
+        self.user = User.objects.get(username='budget0')
+        self.admin = User.objects.create_superuser(
+            email='budget-admin@example.com', username='budget-admin',
+            first_name='Админ', last_name='Бюджетов', password='budget-admin'
+        )
+        recipes = list(
+            Recipe.objects.exclude(author=self.user).order_by('id')[:20]
+        )
+        for model in (Favorites, ShoppingCart):
+            model.objects.filter(user=self.user).delete()
+            model.objects.bulk_create(
+                model(user=self.user, recipe=recipe) for recipe in recipes[1:8]
+            )
+        authors = {recipe.author_id for recipe in recipes[1:]}
+        Subscriptions.objects.filter(user=self.user).delete()
+        Subscriptions.objects.bulk_create(
+            Subscriptions(user=self.user, author_id=author_id)
+            for author_id in authors
+        )
+        author = User.objects.exclude(
+            id__in=authors | {self.user.id}
+        ).filter(recipes__isnull=False).first()
+        tag = Tag.objects.first()
+        self.ingredients = list(Ingredient.objects.all()[:3])
+        self.ids = {
+            'recipe': recipes[0].id,
+            'author': author.id,
+            'tag': tag.id,
+            'tag_slug': tag.slug,
+            'ingredient': self.ingredients[0].id,
+        }
+        self.recipe_data = {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ],
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'image': png_data_url(),
+            'name': 'Проверка бюджета',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        authorized = APIClient()
+        authorized.force_authenticate(self.user)
+        admin = APIClient()
+        admin.force_login(self.admin)
+        self.clients = {False: APIClient(), True: authorized, 'admin': admin}
+
+    def get_data(self, name):
+        if name == 'recipes.create':
+            return self.recipe_data
+        if name == 'recipes.partial_update':
+            return {**self.recipe_data, 'name': 'Обновлённый рецепт'}
+        if name == 'users.avatar':
+            return {'avatar': self.recipe_data['image']}
+        if name == 'batch':
+            return {'requests': [
+                {'method': 'GET', 'path': path.format(**self.ids)}
+                for path in (
+                    '/api/recipes/{recipe}/', '/api/users/{author}/',
+                    '/api/tags/', '/api/recipes/{recipe}/get-link/',
+                )
+            ]}
+        return None
+
+    def test_query_budgets(self):
+        # Записи идут по порядку: изменение и удаление работают с
+        # рецептом, созданным в recipes.create.
+        ids = dict(self.ids)
+        for name, method, path, auth, queries, paged, status in BUDGETS:
+            path = path.format(**ids)
+            if paged:
+                separator = '&' if '?' in path else '?'
+                paths = [f'{path}{separator}limit={size}'
+                         for size in PAGE_SIZES]
+            else:
+                paths = [path]
+            for path in paths:
+                with self.subTest(f'{name} ({LABELS[auth]})', path=path):
+                    with self.assertNumQueries(queries):
+                        response = getattr(self.clients[auth], method)(
+                            path, data=self.get_data(name), format='json'
+                        )
+                    self.assertEqual(response.status_code, status)
+            if name == 'recipes.create':
+                ids['own_recipe'] = response.data['id']
@@ -0,0 +1,54 @@
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.test import APITestCase
+
+from api.tests.base import create_user, local_caches
+from recipes.models import Ingredient, Tag
+
+MESSAGES = PrimaryKeyRelatedField.default_error_messages
+
+
+@local_caches
+class RecipeWriteErrorsTest(APITestCase):
+    """Ошибки тегов и ингредиентов рецепта как у PrimaryKeyRelatedField.
+
+    Число запросов на создание и изменение рецепта проверяет
+    test_query_budgets.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('writer')
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def post(self, tags, ingredient_id):
+        response = self.client.post('/api/recipes/', {
+            'tags': tags,
+            'ingredients': [{'id': ingredient_id, 'amount': 1}],
+            'name': 'Рецепт',
+            'text': 'Текст',
+            'cooking_time': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        return response.json()
+
+    def test_incorrect_type(self):
+        errors = self.post(['abc'], 'abc')
+        message = str(MESSAGES['incorrect_type']).format(data_type='str')
+        self.assertEqual(errors['tags'], [message])
+        self.assertEqual(errors['ingredients'], [{'id': [message]}])
+
+    def test_does_not_exist(self):
+        errors = self.post([self.tag.id + 1], self.ingredient.id + 1)
+        message = str(MESSAGES['does_not_exist'])
+        self.assertEqual(
+            errors['tags'], [message.format(pk_value=self.tag.id + 1)]
+        )
+        self.assertEqual(errors['ingredients'], [
+            {'id': [message.format(pk_value=self.ingredient.id + 1)]}
+        ])
@@ -0,0 +1,26 @@
+import datetime
+import decimal
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+
+DATA = {
+    'text': 'строка\u2028с\u2029разделителями </script>',
+    'values': [1, 2.5, None, True],
+    'created': datetime.datetime(2024, 1, 1, 12, 0, 0, 123456),
+    'amount': decimal.Decimal('1.10'),
+}
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """Ответы ORJSONRenderer побайтно совпадают с JSONRenderer."""
+
+    def test_same_output(self):
+        for media_type in (None, 'application/json; indent=2'):
+            with self.subTest(media_type=media_type):
+                self.assertEqual(
+                    ORJSONRenderer().render(DATA, media_type),
+                    JSONRenderer().render(DATA, media_type)
+                )
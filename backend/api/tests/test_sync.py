@@ -0,0 +1,35 @@
+from rest_framework.test import APITestCase
+
+from api.tests.base import create_recipe, create_user, local_caches
+from recipes.models import Favorites
+
+
+@local_caches
+class SyncCursorTest(APITestCase):
+    """Проверка курсора since."""
+
+    def test_invalid_cursor(self):
+        for since in ('abc', '-1', '²', str(2**63)):
+            with self.subTest(since=since):
+                response = self.client.get('/api/sync/', {'since': since})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('since', response.data)
+
+    def test_cursor_advances(self):
+        user = create_user('sync')
+        self.client.force_authenticate(user)
+        cursor = self.client.get('/api/sync/').data['cursor']
+        recipe = create_recipe(user)
+        Favorites.objects.create(user=user, recipe=recipe)
+        response = self.client.get('/api/sync/', {'since': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [data['id'] for data in response.data['recipe']['upserts']],
+            [recipe.id]
+        )
+        self.assertEqual(response.data['favorite']['upserts'], [recipe.id])
+        response = self.client.get(
+            '/api/sync/', {'since': response.data['cursor']}
+        )
+        self.assertEqual(response.data['recipe']['upserts'], [])
+        self.assertEqual(response.data['favorite']['upserts'], [])
@@ -0,0 +1,29 @@
+from unittest import mock
+
+from rest_framework.test import APITestCase
+
+from api import warmup
+
+
+class ReadyTest(APITestCase):
+    """Повтор неудачных шагов прогрева в /api/ready/."""
+
+    def setUp(self):
+        patcher = mock.patch.dict(warmup.state, failed=['теги'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_step_keeps_503(self):
+        with mock.patch(
+            'api.catalog.get_tags', side_effect=RuntimeError
+        ), self.assertLogs('api.warmup', 'ERROR'):
+            response = self.client.get('/api/ready/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['failed_steps'], ['теги'])
+
+    def test_recovered_step_is_cleared(self):
+        with mock.patch('api.catalog.get_tags') as get_tags:
+            response = self.client.get('/api/ready/')
+        get_tags.assert_called_once_with()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['failed_steps'], [])
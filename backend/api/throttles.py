@@ -0,0 +1,118 @@
+"""Ограничение частоты дорогих запросов корзинами токенов.
+
+У каждого пользователя и у каждого IP своя корзина ёмкостью
+THROTTLE_*_CAPACITY токенов, которая пополняется на THROTTLE_*_RATE
+токенов в минуту. Действие из THROTTLE_COSTS (ключ — basename роутера
+и имя действия) списывает свою стоимость из обеих корзин. Состояние
+корзины — пара (токены, время) в кеше throttle, общем для всех
+воркеров; БД не запрашивается. Чтение и запись корзины выполняются под
+блокировкой на ключ (cache.add), иначе одновременные запросы скрипта
+прочитали бы одну полную корзину и прошли бы все. Запрос, который не
+дождался блокировки за LOCK_WAIT, отклоняется: одновременные запросы к
+одной корзине — это и есть всплеск.
+"""
+import math
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from api.metrics import registry
+from api.utils import get_client_ip
+
+CACHE_KEY = 'throttle:{}:{}'
+# Блокировку упавшего процесса кеш сам удалит через LOCK_TIMEOUT секунд.
+LOCK_TIMEOUT = 1
+LOCK_WAIT = 0.05
+LOCK_POLL_INTERVAL = 0.005
+
+
+@contextmanager
+def bucket_lock(cache, key):
+    """Монопольный доступ к корзине; выдаёт False, если не дождались."""
+    lock_key = f'{key}:lock'
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock_key, owner, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            yield False
+            return
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield True
+    finally:
+        # Чужую блокировку не удаляем: наша могла истечь и достаться
+        # другому запросу. Между get и delete она истечь не успеет,
+        # работа под ней на порядки короче LOCK_TIMEOUT.
+        if cache.get(lock_key) == owner:
+            cache.delete(lock_key)
+
+
+def take(state, capacity, rate, cost, now):
+    """Новое состояние корзины и время ожидания, если токенов не хватает.
+
+    rate — токенов в секунду.
+    """
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    cost = min(cost, capacity)
+    if tokens < cost:
+        return (tokens, now), (cost - tokens) / rate
+    return (tokens - cost, now), 0.0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Корзины токенов пользователя и IP для действий из THROTTLE_COSTS."""
+
+    def get_buckets(self, request):
+        buckets = [(
+            CACHE_KEY.format('ip', get_client_ip(request)),
+            settings.THROTTLE_IP_CAPACITY,
+            settings.THROTTLE_IP_RATE / 60,
+        )]
+        if request.user.is_authenticated:
+            buckets.append((
+                CACHE_KEY.format('user', request.user.pk),
+                settings.THROTTLE_USER_CAPACITY,
+                settings.THROTTLE_USER_RATE / 60,
+            ))
+        return buckets
+
+    def allow_request(self, request, view):
+        self.delay = 0.0
+        action = f'{view.basename}.{view.action}'
+        cost = settings.THROTTLE_COSTS.get(action)
+        if not cost:
+            return True
+        cache = caches['throttle']
+        buckets = self.get_buckets(request)
+        with ExitStack() as stack:
+            if not all(
+                stack.enter_context(bucket_lock(cache, key))
+                for key, _, _ in buckets
+            ):
+                registry.inc('foodgram_throttled_total', {'action': action})
+                self.delay = LOCK_WAIT
+                return False
+            now = time.time()
+            states = cache.get_many([key for key, _, _ in buckets])
+            updated = {}
+            for key, capacity, rate in buckets:
+                updated[key], delay = take(
+                    states.get(key), capacity, rate, cost, now
+                )
+                self.delay = max(self.delay, delay)
+            if not self.delay:
+                cache.set_many(updated, math.ceil(max(
+                    capacity / rate for _, capacity, rate in buckets
+                )))
+        if self.delay:
+            registry.inc('foodgram_throttled_total', {'action': action})
+            return False
+        return True
+
+    def wait(self):
+        return self.delay
@@ -1,7 +1,19 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagsViewSet, UserViewSet
+from backend.async_views import async_read_view
+
+from .views import (
+    IngredientViewSet,
+    RecipeViewSet,
+    TagsViewSet,
+    UserViewSet,
+    batch,
+    events_ticket,
+    metrics,
+    ready,
+    sync
+)
 
 app_name = 'api'
 
@@ -11,8 +23,22 @@ api_v1.register('recipes', RecipeViewSet, basename='recipes')
 api_v1.register('tags', TagsViewSet, basename='tags')
 api_v1.register('ingredients', IngredientViewSet, basename='ingredients')
 
+ASYNC_READ_ROUTES = {
+    'recipes-list', 'recipes-detail',
+    'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail',
+}
+for pattern in api_v1.urls:
+    if pattern.name in ASYNC_READ_ROUTES:
+        pattern.callback = async_read_view(pattern.callback)
+
 
 urlpatterns = [
     path('', include(api_v1.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', metrics, name='metrics'),
+    path('sync/', sync, name='sync'),
+    path('events/ticket/', events_ticket, name='events_ticket'),
+    path('batch/', batch, name='batch'),
+    path('ready/', ready, name='ready'),
 ]
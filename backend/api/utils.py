@@ -0,0 +1,38 @@
+from functools import lru_cache
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def parse_networks(networks):
+    return tuple(ip_network(network) for network in networks)
+
+
+def in_networks(address, networks):
+    """Входит ли адрес в одну из сетей; некорректный адрес — нет."""
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in parse_networks(networks))
+
+
+def get_client_ip(request):
+    """Адрес клиента.
+
+    Заголовку X-Real-IP можно верить, только если его выставил nginx,
+    поэтому он учитывается лишь для соединений от TRUSTED_PROXIES.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    if in_networks(remote_addr, tuple(settings.TRUSTED_PROXIES)):
+        return request.META.get('HTTP_X_REAL_IP') or remote_addr
+    return remote_addr
+
+
+def get_request_cache(request):
+    """Словарь для данных, которые запоминаются на время запроса."""
+    django_request = getattr(request, '_request', request)
+    if not hasattr(django_request, 'request_cache'):
+        django_request.request_cache = {}
+    return django_request.request_cache
@@ -1,31 +1,49 @@
-from django.db.models import Sum
+import os
+
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery, Sum
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser import views as djoser_views
-from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from api import catalog, warmup
+from api.batch import dispatch
 from api.filters import IngredientFilter, RecipeFilter
 from api.converters_shopping_cart import pdf_shopping_cart
+from api.events import issue_ticket
+from api.metrics import registry
 from api.paginations import RecipePagination
-from api.permissions import AuthorPermission
+from api.permissions import AuthorPermission, InternalOrStaffPermission
+from api.renderers import ORJSONParser
 from api.serializers import (
     AvatarSerializer,
+    BatchSerializer,
     FavoritesSerializer,
     IngredientSerializer,
+    RecipeReadSerializer,
     RecipeSerializer,
     ShoppingCartSerializer,
     ShortRecipesSerializer,
     SubscribeSerializer,
     SubscriptionsSerializer,
     TagSerializer,
-    UserSerializer
+    UserSerializer,
+    get_requested_fields
 )
+from api.sync import CursorExpired, current_cursor, get_changes
+from api.throttles import TokenBucketThrottle
+from recipes import shortlinks
 from recipes.models import (
+    ChangeLog,
     Favorites,
     Ingredient,
     Recipe,
@@ -38,22 +56,70 @@ from users.models import Subscriptions
 
 User = get_user_model()
 
+# Изображения можно передать файлом в multipart/form-data: такой запрос
+# разбирается потоково и большие файлы сохраняются во временный файл.
+IMAGE_UPLOAD_PARSERS = (ORJSONParser, MultiPartParser, FormParser)
+
+
+def get_recipe_queryset(user, fields=RecipeReadSerializer.Meta.fields):
+    """Рецепты со связями и флагами пользователя для чтения.
+
+    Загружаются только связи и столбцы, нужные для полей ответа fields.
+    """
+    queryset = Recipe.objects.all()
+    if 'author' in fields:
+        queryset = queryset.select_related('author')
+    if 'tags' in fields:
+        queryset = queryset.prefetch_related('tags')
+    if 'ingredients' in fields:
+        queryset = queryset.prefetch_related(Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ))
+    if 'text' not in fields:
+        queryset = queryset.defer('text')
+    if user.is_authenticated and (
+        'is_favorited' in fields or 'is_in_shopping_cart' in fields
+    ):
+        queryset = queryset.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+    return queryset
+
 
 class UserViewSet(djoser_views.UserViewSet):
     """Представления для пользователей."""
     serializer_class = UserSerializer
     pagination_class = RecipePagination
+    throttle_classes = (TokenBucketThrottle,)
 
     def get_permissions(self):
         if self.action == "me":
             self.permission_classes = (IsAuthenticated,)
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields = get_requested_fields(
+            self.request, UserSerializer.Meta.fields
+        )
+        return queryset.only('id', *(
+            field for field in fields if field != 'is_subscribed'
+        ))
+
     @action(
         methods=['put'],
         url_path='me/avatar',
         serializer_class=AvatarSerializer,
         permission_classes=(IsAuthenticated,),
+        parser_classes=IMAGE_UPLOAD_PARSERS,
         detail=False,
     )
     def avatar(self, request):
@@ -84,7 +150,9 @@ class UserViewSet(djoser_views.UserViewSet):
             data={'user': request.user.id, 'author': author.id}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        # Подписка и запись журнала изменений в одной транзакции.
+        with transaction.atomic():
+            serializer.save()
         serializer = SubscriptionsSerializer(
             author,
             context={'request': request}
@@ -103,8 +171,7 @@ class UserViewSet(djoser_views.UserViewSet):
                 {'detail': 'Вы не были подписаны на этого автора.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        return Response({'detail': 'Подписка отменена.'},
-                        status=status.HTTP_204_NO_CONTENT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False,
@@ -113,9 +180,31 @@ class UserViewSet(djoser_views.UserViewSet):
         serializer_class=SubscriptionsSerializer
     )
     def subscriptions(self, request):
-        queryset = self.paginate_queryset(
-            User.objects.filter(subscriptions__user=self.request.user)
+        fields = get_requested_fields(
+            request, SubscriptionsSerializer.Meta.fields
         )
+        queryset = User.objects.filter(
+            subscriptions__user=self.request.user
+        ).order_by(*User._meta.ordering)
+        if 'recipes_count' in fields:
+            queryset = queryset.annotate(recipes_count=Count('recipes'))
+        if 'recipes' in fields:
+            recipes = Recipe.objects.all()
+            recipes_limit = SubscriptionsSerializer.get_recipes_limit(
+                request
+            )
+            if recipes_limit is not None:
+                # Первые recipes_limit рецептов каждого автора одним
+                # запросом.
+                recipes = recipes.filter(pk__in=Subquery(
+                    Recipe.objects.filter(
+                        author=OuterRef('author')
+                    ).values('pk')[:recipes_limit]
+                ))
+            queryset = queryset.prefetch_related(
+                Prefetch('recipes', queryset=recipes)
+            )
+        queryset = self.paginate_queryset(queryset)
         serializer = SubscriptionsSerializer(
             queryset,
             many=True,
@@ -125,13 +214,35 @@ class UserViewSet(djoser_views.UserViewSet):
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    """Представления для рецептов."""
+    """Представления для рецептов.
+
+    В multipart/form-data теги передаются повторяющимся полем tags,
+    а ингредиенты полями вида ingredients[0]id и ingredients[0]amount.
+    """
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (AuthorPermission,)
+    parser_classes = IMAGE_UPLOAD_PARSERS
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
     pagination_class = RecipePagination
+    throttle_classes = (TokenBucketThrottle,)
+
+    def get_queryset(self):
+        if self.action in ('update', 'partial_update'):
+            # Теги и ингредиенты ответа RecipeSerializer берёт из
+            # сохранённых данных.
+            return get_recipe_queryset(self.request.user, (
+                'author', 'text', 'is_favorited', 'is_in_shopping_cart'
+            ))
+        if self.action not in ('list', 'retrieve'):
+            return get_recipe_queryset(self.request.user)
+        return get_recipe_queryset(
+            self.request.user,
+            get_requested_fields(
+                self.request, RecipeReadSerializer.Meta.fields
+            )
+        )
 
     def create_obj(self, create_serializer, request, pk=None):
         recipe = get_object_or_404(Recipe, id=pk)
@@ -139,7 +250,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             data={'user': request.user.id, 'recipe': recipe.id}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         serializer = ShortRecipesSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -154,8 +266,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 {'detail': 'Вы не добавляли этот рецепт!'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        return Response({'detail': 'Рецепт удален.'},
-                        status=status.HTTP_204_NO_CONTENT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         methods=['post'],
@@ -208,7 +319,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_short_link(self, request, pk=None):
         recipe = get_object_or_404(Recipe, id=pk)
         short_link = request.build_absolute_uri(
-            reverse('recipes:short_link', args=[recipe.pk])
+            reverse('recipes:short_link', args=[shortlinks.encode(recipe.pk)])
         )
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
 
@@ -219,6 +330,9 @@ class TagsViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return Response(catalog.get_tags())
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Представления для ингредиентов."""
@@ -227,3 +341,102 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     filter_backends = (DjangoFilterBackend, )
     filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        return Response(
+            catalog.get_ingredients(request.query_params.get('name', ''))
+        )
+
+
+@api_view(['GET'])
+@permission_classes((InternalOrStaffPermission,))
+def metrics(request):
+    """Метрики в формате Prometheus."""
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+# Курсор — позиция записи журнала (txid или id), столбец bigint.
+SYNC_CURSOR_FIELD = serializers.IntegerField(min_value=0, max_value=2**63 - 1)
+
+
+@api_view(['GET'])
+@permission_classes((AllowAny,))
+def sync(request):
+    """Изменения после курсора since.
+
+    Без since возвращается только текущий курсор. Рецепты передаются
+    целиком, избранное, корзина и подписки — идентификаторами.
+    """
+    since = request.query_params.get('since')
+    if since is None:
+        return Response({'cursor': current_cursor()})
+    try:
+        since = SYNC_CURSOR_FIELD.run_validation(since)
+    except ValidationError as error:
+        raise ValidationError({'since': error.detail})
+    try:
+        changes, cursor, has_more = get_changes(request.user, since)
+    except CursorExpired:
+        return Response(
+            {'detail': 'Курсор устарел, загрузите данные заново.'},
+            status=status.HTTP_410_GONE
+        )
+    recipes = changes[ChangeLog.RECIPE]
+    recipes['upserts'] = RecipeReadSerializer(
+        get_recipe_queryset(request.user).filter(id__in=recipes['upserts']),
+        many=True,
+        context={'request': request}
+    ).data
+    return Response({'cursor': cursor, 'has_more': has_more, **changes})
+
+
+@api_view(['POST'])
+@permission_classes((IsAuthenticated,))
+def events_ticket(request):
+    """Одноразовый билет для подключения EventSource к /api/events/."""
+    return Response(
+        {'ticket': issue_ticket(request.user)},
+        status=status.HTTP_201_CREATED
+    )
+
+
+@api_view(['POST'])
+@permission_classes((AllowAny,))
+def batch(request):
+    """Несколько запросов к API за один вызов.
+
+    Подзапросы выполняются по порядку с авторизацией пакета, ответы
+    возвращаются в том же порядке. Ошибка подзапроса не прерывает пакет.
+    """
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return Response({'responses': [
+        dispatch(request, **sub_request)
+        for sub_request in serializer.validated_data['requests']
+    ]})
+
+
+@api_view(['GET'])
+@permission_classes((AllowAny,))
+def ready(request):
+    """Состояние прогрева процесса, обслужившего запрос.
+
+    preloaded — процесс получил прогретые данные от master через fork.
+    Неудачные шаги прогрева повторяются; пока какой-то из них не
+    выполнился, ответ 503.
+    """
+    state = warmup.state
+    if state['failed']:
+        warmup.retry_failed()
+    return Response({
+        'status': 'warm' if state['warm'] else 'cold',
+        'warmup_seconds': state['seconds'],
+        'preloaded': state['warm'] and state['pid'] != os.getpid(),
+        'failed_steps': state['failed'],
+    }, status=(
+        status.HTTP_503_SERVICE_UNAVAILABLE if state['failed']
+        else status.HTTP_200_OK
+    ))
@@ -0,0 +1,100 @@
+"""Прогрев процесса перед fork воркеров.
+
+gunicorn с preload_app импортирует приложение в master-процессе, и всё,
+что загружено до fork, воркеры получают готовым и делят страницы памяти
+copy-on-write. Прогрев разбирает шрифт и импортирует reportlab, заполняет
+URL resolver, кеши полей сериализаторов, битовую карту коротких ссылок
+и справочники тегов и ингредиентов.
+После прогрева объекты замораживаются в gc, чтобы сборщик мусора не
+трогал их страницы, а соединения с БД закрываются: воркеры не должны
+делить сокеты master-процесса.
+"""
+import gc
+import importlib
+import logging
+import os
+import time
+
+from django.db import connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+state = {'warm': False, 'seconds': None, 'pid': None, 'failed': []}
+
+
+def warm_serializers():
+    from api import serializers
+
+    for serializer in (
+        serializers.RecipeReadSerializer,
+        serializers.RecipeSerializer,
+        serializers.ShortRecipesSerializer,
+        serializers.SubscriptionsSerializer,
+        serializers.TagSerializer,
+        serializers.IngredientSerializer,
+    ):
+        # Вложенные сериализаторы строят поля при первом обращении.
+        for field in serializer().fields.values():
+            getattr(field, 'fields', None)
+            getattr(getattr(field, 'child', None), 'fields', None)
+
+
+def get_steps():
+    """Шаги прогрева: название -> функция."""
+    from api import catalog
+    from api.converters_shopping_cart import register_font
+    from recipes.shortlinks import recipe_ids
+
+    return {
+        'reportlab': lambda: importlib.import_module(
+            'reportlab.pdfgen.canvas'
+        ),
+        'шрифт PDF': register_font,
+        'URL resolver': lambda: get_resolver()._populate(),
+        'сериализаторы': warm_serializers,
+        'короткие ссылки': recipe_ids.refresh,
+        'теги': catalog.get_tags,
+        'ингредиенты': catalog.get_ingredients,
+    }
+
+
+def run_steps(names):
+    """Выполняет шаги, в state['failed'] остаются только неудачные."""
+    steps = get_steps()
+    for name in names:
+        try:
+            steps[name]()
+        except Exception:
+            # Недоступная БД не должна мешать запуску: данные
+            # загрузятся при первом запросе, а шаг повторит /api/ready/.
+            logger.exception('Прогрев: не удалось выполнить «%s»', name)
+            if name not in state['failed']:
+                state['failed'].append(name)
+        else:
+            if name in state['failed']:
+                state['failed'].remove(name)
+
+
+def retry_failed():
+    """Повторяет неудачные шаги прогрева в текущем процессе."""
+    run_steps(list(state['failed']))
+
+
+def warm_up():
+    """Загружает общие для воркеров данные, вызывается один раз."""
+    if state['warm']:
+        return
+    started = time.perf_counter()
+    try:
+        run_steps(get_steps())
+    finally:
+        connections.close_all()
+    gc.collect()
+    gc.freeze()
+    state.update(
+        warm=True,
+        seconds=round(time.perf_counter() - started, 3),
+        pid=os.getpid(),
+    )
+    logger.info('Прогрев завершён за %.3f с', state['seconds'])
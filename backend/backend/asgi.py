@@ -9,8 +9,23 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.events import events_application  # noqa: E402
+
+if settings.WARMUP_ON_LOAD:
+    from api.warmup import warm_up
+
+    warm_up()
+
+
+async def application(scope, receive, send):
+    """Поток событий отдаётся напрямую, остальное — Django."""
+    if scope['type'] == 'http' and scope['path'] == '/api/events/':
+        return await events_application(scope, receive, send)
+    return await django_application(scope, receive, send)
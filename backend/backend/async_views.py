@@ -0,0 +1,45 @@
+"""Асинхронные обёртки над синхронными представлениями для ASGI.
+
+В режиме ASGI синхронное представление Django выполняет в одном общем
+потоке, и медленные запросы встают в очередь друг за другом. Обёртка
+выполняет безопасные запросы (GET, HEAD, OPTIONS) в пуле потоков
+параллельно, а запись оставляет в общем потоке, как без обёртки.
+"""
+import asyncio
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+def render(view, request, *args, **kwargs):
+    # Соединения потоков пула закрываются по CONN_MAX_AGE так же, как
+    # Django делает это для синхронного запроса.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """Асинхронная версия view: чтение параллельно, запись как раньше.
+
+    Без ASYNC_READ_VIEWS возвращает view без изменений.
+    """
+    if not settings.ASYNC_READ_VIEWS or asyncio.iscoroutinefunction(view):
+        return view
+    concurrent = sync_to_async(render, thread_sensitive=False)
+    serial = sync_to_async(view, thread_sensitive=True)
+
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await concurrent(view, request, *args, **kwargs)
+        return await serial(request, *args, **kwargs)
+
+    return update_wrapper(wrapper, view)
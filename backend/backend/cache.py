@@ -0,0 +1,192 @@
+"""Двухуровневый кеш: LRU в памяти процесса перед общим кешем Django.
+
+Каждое пространство имён (namespace) хранит в общем кеше две метки.
+Версия входит в ключи общего кеша: invalidate() заменяет её, и все
+прежние записи пространства становятся недоступны. Поколение меняется
+при любой инвалидации, в том числе при удалении отдельных ключей;
+процесс сверяет его не чаще раза в CACHE_CHECK_INTERVAL секунд и при
+изменении очищает свой локальный уровень. Так изменения из админки или
+другого воркера видны везде не позже чем через CACHE_CHECK_INTERVAL.
+
+Метки — случайные uuid, а не счётчики: общий кеш может вытеснить ключ
+метки, и счётчик начался бы заново и повторил прежнее значение вместе
+с устаревшими записями. Новая метка с прежними не совпадает никогда.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.metrics import registry
+
+MISSING = object()
+VERSION_KEY = 'cache:{}:version'
+GENERATION_KEY = 'cache:{}:generation'
+STAT_KEYS = {
+    'local_hit': 'local_hits',
+    'shared_hit': 'shared_hits',
+    'miss': 'misses',
+}
+
+
+def new_mark():
+    return uuid.uuid4().hex
+
+
+def get_mark(key, value=None):
+    """Метка из общего кеша; отсутствующую создаёт первый процесс."""
+    if value is None:
+        value = cache.get(key)
+    if value is None:
+        value = new_mark()
+        cache.add(key, value, None)
+        value = cache.get(key) or value
+    return value
+
+
+def set_mark(key):
+    value = new_mark()
+    cache.set(key, value, None)
+    return value
+
+
+def get_generation(namespace):
+    return get_mark(GENERATION_KEY.format(namespace))
+
+
+def bump_generation(namespace):
+    """Сообщает всем процессам об изменении данных пространства."""
+    return set_mark(GENERATION_KEY.format(namespace))
+
+
+def invalidate(namespace):
+    """Делает недоступными все записи пространства во всех процессах."""
+    set_mark(VERSION_KEY.format(namespace))
+    bump_generation(namespace)
+    local = TwoTierCache.instances.get(namespace)
+    if local is not None:
+        local.clear()
+
+
+class TwoTierCache:
+    """Кеш пространства имён с локальным LRU размером до local_size."""
+
+    instances = {}
+
+    def __init__(self, namespace, local_size=None, timeout=None):
+        self.namespace = namespace
+        self.local_size = local_size or settings.CACHE_LOCAL_SIZE
+        self.timeout = timeout or settings.CACHE_TIMEOUT
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = None
+        self.generation = None
+        self.checked = -float('inf')
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+        self.instances[namespace] = self
+
+    def sync(self):
+        now = time.monotonic()
+        if now - self.checked < settings.CACHE_CHECK_INTERVAL:
+            return
+        keys = (
+            VERSION_KEY.format(self.namespace),
+            GENERATION_KEY.format(self.namespace),
+        )
+        values = cache.get_many(keys)
+        version, generation = (get_mark(key, values.get(key)) for key in keys)
+        with self.lock:
+            self.checked = now
+            if (version, generation) != (self.version, self.generation):
+                self.local.clear()
+                self.version, self.generation = version, generation
+
+    def shared_key(self, key):
+        return f'{self.namespace}:{self.version}:{key}'
+
+    def count(self, result):
+        self.stats[STAT_KEYS[result]] += 1
+        registry.inc(
+            'foodgram_cache_requests_total',
+            {'cache': self.namespace, 'result': result}
+        )
+
+    def remember(self, key, value):
+        with self.lock:
+            self.local[key] = (time.monotonic() + self.timeout, value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
+
+    def get(self, key, default=None):
+        self.sync()
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.local.move_to_end(key)
+                self.count('local_hit')
+                return entry[1]
+        value = cache.get(self.shared_key(key), MISSING)
+        if value is MISSING:
+            self.count('miss')
+            return default
+        self.count('shared_hit')
+        self.remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self.sync()
+        cache.set(self.shared_key(key), value, self.timeout)
+        self.remember(key, value)
+
+    def get_or_set(self, key, load):
+        """Значение из кеша или результат load(), который сохраняется."""
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            generation = get_generation(self.namespace)
+            value = load()
+            self.set(key, value)
+            # Пока шла загрузка, ключ могли удалить. delete() меняет
+            # поколение до удаления ключей, поэтому устаревшее значение
+            # уберёт либо эта проверка, либо сам delete().
+            if get_generation(self.namespace) != generation:
+                self.discard(key)
+        return value
+
+    def discard(self, key):
+        cache.delete(self.shared_key(key))
+        with self.lock:
+            self.local.pop(key, None)
+
+    def delete(self, *keys):
+        """Удаляет ключи во всех процессах, остальные записи остаются."""
+        self.sync()
+        bump_generation(self.namespace)
+        cache.delete_many([self.shared_key(key) for key in keys])
+        with self.lock:
+            for key in keys:
+                self.local.pop(key, None)
+
+    def invalidate(self):
+        invalidate(self.namespace)
+
+    def clear(self):
+        """Очищает только локальный уровень этого процесса."""
+        with self.lock:
+            self.local.clear()
+            # Следующее обращение заново сверит версию.
+            self.checked = -float('inf')
+
+    def get_stats(self):
+        """Счётчики попаданий: hits — сколько загрузок сэкономлено."""
+        hits = self.stats['local_hits'] + self.stats['shared_hits']
+        total = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'hits': hits,
+            'hit_rate': hits / total if total else 0.0,
+            'local_size': len(self.local),
+        }
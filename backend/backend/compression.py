@@ -0,0 +1,119 @@
+"""Сжатие ответов по заголовку Accept-Encoding.
+
+Поддерживаются brotli (если установлен пакет brotli) и gzip. Ответы
+меньше COMPRESSION_MIN_SIZE байт, потоковые, уже сжатые и с типом
+содержимого, который плохо сжимается, отдаются как есть.
+"""
+import asyncio
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml|x-ndjson)|image/svg)'
+)
+
+
+def gzip_compress(content):
+    return gzip.compress(
+        content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0
+    )
+
+
+def brotli_compress(content):
+    return brotli.compress(
+        content, quality=settings.COMPRESSION_BROTLI_QUALITY
+    )
+
+
+ENCODERS = {'gzip': gzip_compress}
+if brotli is not None:
+    ENCODERS['br'] = brotli_compress
+
+
+def parse_accept_encoding(header):
+    """Словарь кодировка -> вес q из заголовка Accept-Encoding."""
+    weights = {}
+    for item in header.split(','):
+        coding, *params = item.strip().lower().split(';')
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+    return weights
+
+
+def choose_encoding(header):
+    """Лучшая поддерживаемая кодировка; brotli при равных весах."""
+    weights = parse_accept_encoding(header)
+    best, best_weight = None, 0.0
+    for coding in ('br', 'gzip'):
+        if coding not in ENCODERS:
+            continue
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """Сжимает тело ответа brotli или gzip."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not COMPRESSIBLE_TYPES.match(
+                response.get('Content-Type', '')
+            )
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        compressed = ENCODERS[encoding](response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # Сжатое тело отличается побайтно, сильный ETag становится слабым.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
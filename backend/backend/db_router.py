@@ -0,0 +1,181 @@
+"""Чтение с реплик с привязкой к основной БД после записи.
+
+ReplicaRoutingMiddleware выбирает для запроса с безопасным методом
+здоровую реплику по кругу и сохраняет её в contextvars, ReplicaRouter
+отправляет туда чтение. Запись и все запросы клиента в течение
+REPLICA_STICKY_SECONDS после неё идут в основную БД, чтобы клиент
+видел свои изменения несмотря на задержку репликации. Клиент — это его
+IP и, если запрос с токеном, пользователь: вход идёт без токена, а
+следующие запросы уже с ним.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication
+from api.utils import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+read_alias = ContextVar('read_alias', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'db_sticky:{}:{}'
+
+
+class ReplicaRouter:
+    """Чтение с выбранной для запроса реплики, запись в основную БД."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPool:
+    """Круговой выбор реплик с проверкой здоровья и отставания."""
+
+    def __init__(self, aliases):
+        self.aliases = aliases
+        self.cycle = itertools.cycle(aliases)
+        self.checked = {}
+        self.healthy = {}
+        self.lock = threading.Lock()
+
+    def choose(self):
+        for _ in range(len(self.aliases)):
+            with self.lock:
+                alias = next(self.cycle)
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        if now - self.checked.get(alias, -float('inf')) >= (
+            settings.REPLICA_HEALTH_INTERVAL
+        ):
+            self.checked[alias] = now
+            self.healthy[alias] = self.check(alias)
+        return self.healthy[alias]
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor != 'postgresql':
+                    cursor.execute('SELECT 1')
+                    return True
+                # Реплика, применившая всё полученное, не отстаёт, даже
+                # если основная БД давно ничего не записывала.
+                cursor.execute(
+                    'SELECT CASE WHEN pg_last_wal_receive_lsn() = '
+                    'pg_last_wal_replay_lsn() THEN 0 ELSE '
+                    'COALESCE(EXTRACT(EPOCH FROM now() - '
+                    'pg_last_xact_replay_timestamp()), 0) END'
+                )
+                lag = cursor.fetchone()[0]
+        except OperationalError:
+            logger.warning('Реплика %s недоступна', alias)
+            return False
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning('Реплика %s отстаёт на %.1f с', alias, lag)
+            return False
+        return True
+
+    def mark_unhealthy(self, alias):
+        self.checked[alias] = time.monotonic()
+        self.healthy[alias] = False
+
+
+class ReplicaRoutingMiddleware:
+    """Выбирает БД для чтения на время запроса."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.pool = ReplicaPool(settings.DATABASE_REPLICAS)
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def sticky_keys(request, user_id=None):
+        keys = [STICKY_KEY.format('ip', get_client_ip(request))]
+        if user_id is not None:
+            keys.append(STICKY_KEY.format('user', user_id))
+        return keys
+
+    @staticmethod
+    def get_token_user_id(request):
+        """Пользователь по токену: DRF проверит его позже, в представлении."""
+        try:
+            credentials = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        return credentials and credentials[0].pk
+
+    def choose_alias(self, request):
+        if request.method not in SAFE_METHODS:
+            return None
+        keys = self.sticky_keys(request, self.get_token_user_id(request))
+        if cache.get_many(keys):
+            return None
+        return self.pool.choose()
+
+    def finish(self, request):
+        if request.method in SAFE_METHODS:
+            return
+        # DRF записывает пользователя по токену и в исходный запрос.
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user and user.is_authenticated else None
+        cache.set_many(
+            dict.fromkeys(self.sticky_keys(request, user_id), 1),
+            settings.REPLICA_STICKY_SECONDS
+        )
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = read_alias.set(self.choose_alias(request))
+        try:
+            return self.get_response(request)
+        finally:
+            read_alias.reset(token)
+            self.finish(request)
+
+    async def __acall__(self, request):
+        # Проверка реплики и кеш — синхронные операции.
+        alias = await sync_to_async(self.choose_alias)(request)
+        token = read_alias.set(alias)
+        try:
+            return await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+            await sync_to_async(self.finish)(request)
+
+    def process_exception(self, request, exception):
+        alias = read_alias.get()
+        if alias and isinstance(exception, OperationalError):
+            self.pool.mark_unhealthy(alias)
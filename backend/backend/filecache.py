@@ -0,0 +1,32 @@
+"""Файловый кеш с атомарными add() и incr() между процессами.
+
+У FileBasedCache из Django add() — это проверка has_key() и отдельная
+запись, а incr() — чтение и запись, поэтому два воркера могут оба
+«успешно» добавить один ключ. Здесь обе операции выполняются под
+блокировкой fcntl на файле в каталоге кеша, общей для всех процессов,
+которые этот каталог используют.
+"""
+import fcntl
+import os
+from contextlib import contextmanager
+
+from django.core.cache.backends import filebased
+
+
+class FileBasedCache(filebased.FileBasedCache):
+
+    @contextmanager
+    def locked(self):
+        self._createdir()
+        # Файл без суффикса .djcache: очистка и вытеснение его не трогают.
+        with open(os.path.join(self._dir, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def add(self, *args, **kwargs):
+        with self.locked():
+            return super().add(*args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        with self.locked():
+            return super().incr(*args, **kwargs)
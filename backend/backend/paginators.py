@@ -0,0 +1,39 @@
+"""Пагинатор админки для больших таблиц.
+
+Список без фильтров PostgreSQL-таблицы с миллионами строк считается
+через COUNT(*) по всей таблице при каждом открытии страницы. Для таких
+списков число строк берётся из статистики планировщика pg_class, точный
+подсчёт остаётся для небольших таблиц и отфильтрованных списков.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Оценивает число строк таблицы, если их больше exact_count_limit."""
+
+    exact_count_limit = 10000
+
+    def estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [connection.ops.quote_name(queryset.model._meta.db_table)]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] <= self.exact_count_limit:
+            return None
+        return int(row[0])
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            estimate = self.estimate()
+            if estimate is not None:
+                return estimate
+        return super().count
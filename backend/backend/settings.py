@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
@@ -33,6 +34,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
+    'backend.db_router.ReplicaRoutingMiddleware',
+    'backend.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,6 +44,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 DJOSER = {
@@ -59,17 +64,81 @@ DJOSER = {
 REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Сжатие ответов: минимальный размер тела в байтах и уровни сжатия.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
 AUTH_USER_MODEL = 'users.User'
 
+# Общий для всех воркеров кеш. Файловый кеш не требует отдельного
+# сервиса; для нескольких серверов задайте memcached или redis.
+# Корзины ограничения частоты лежат в отдельном кеше: ключей по одному
+# на IP много, и их вытеснение не должно задевать токены и метки.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'backend.filecache.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000))},
+    },
+    'throttle': {
+        'BACKEND': os.getenv(
+            'THROTTLE_CACHE_BACKEND', 'backend.filecache.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'THROTTLE_CACHE_LOCATION', '/tmp/foodgram_throttle'
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('THROTTLE_CACHE_MAX_ENTRIES', 50000))
+        },
+    },
+}
+# Двухуровневый кеш (backend/cache.py): срок жизни записей, размер LRU
+# процесса на пространство имён и как часто процесс сверяет поколение.
+CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', 600))
+CACHE_LOCAL_SIZE = int(os.getenv('CACHE_LOCAL_SIZE', 256))
+CACHE_CHECK_INTERVAL = float(os.getenv('CACHE_CHECK_INTERVAL', 1))
+# Сколько разных поисковых запросов ингредиентов хранит процесс.
+INGREDIENT_CACHE_LOCAL_SIZE = int(
+    os.getenv('INGREDIENT_CACHE_LOCAL_SIZE', 512)
+)
+
+# Ограничение частоты дорогих действий: ёмкость корзины токенов и
+# пополнение в минуту для пользователя и для IP, стоимость действий.
+THROTTLE_USER_CAPACITY = int(os.getenv('THROTTLE_USER_CAPACITY', 20))
+THROTTLE_USER_RATE = float(os.getenv('THROTTLE_USER_RATE', 10))
+THROTTLE_IP_CAPACITY = int(os.getenv('THROTTLE_IP_CAPACITY', 60))
+THROTTLE_IP_RATE = float(os.getenv('THROTTLE_IP_RATE', 30))
+THROTTLE_COSTS = {
+    'recipes.create': 2,
+    'recipes.download_shopping_cart': 5,
+    'users.avatar': 3,
+}
+
+# Кеширование токенов: общий кеш и ограниченный LRU в памяти процесса.
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 300))
+TOKEN_CACHE_LOCAL_SIZE = int(os.getenv('TOKEN_CACHE_LOCAL_SIZE', 1024))
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -91,9 +160,10 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
+# DB_ENGINE=django.db.backends.sqlite3 — для тестов в CI без PostgreSQL.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
@@ -102,6 +172,27 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS="host1 host2:5433". В тестах
+# реплики указывают на тестовую основную БД.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    os.getenv('DB_REPLICA_HOSTS', '').split(), start=1
+):
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной БД.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+REPLICA_HEALTH_INTERVAL = float(os.getenv('REPLICA_HEALTH_INTERVAL', 5))
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 10))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -141,6 +232,92 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+DEFAULT_FILE_STORAGE = 'backend.storage.ContentAddressedStorage'
+
+# Загрузка изображений: файлы больше порога уходят во временный файл на
+# диске, IMAGE_MAX_SIZE ограничивает размер декодированного изображения.
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 2 * 1024 * 1024)
+)
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+
+# Замеры запросов: заголовок Server-Timing и лог медленных запросов.
+# Заголовок получают только персонал и адреса из INTERNAL_NETWORKS.
+INSTRUMENTATION_ENABLED = (
+    os.getenv('INSTRUMENTATION_ENABLED', default='True') == 'True'
+)
+SERVER_TIMING_HEADER = (
+    os.getenv('SERVER_TIMING_HEADER', default='False') == 'True'
+)
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', 30))
+SLOW_REQUEST_DUPLICATE_QUERIES = int(
+    os.getenv('SLOW_REQUEST_DUPLICATE_QUERIES', 10)
+)
+
+# Метрики Prometheus: файлы процессов и адреса, которым доступен сбор.
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+# Сбор метрик без входа разрешён только с этих адресов; Prometheus в
+# другом контейнере добавляется сюда явно.
+INTERNAL_NETWORKS = os.getenv(
+    'INTERNAL_NETWORKS', '127.0.0.0/8 ::1/128'
+).split()
+# Прокси, которым можно верить в заголовке X-Real-IP. Порт backend
+# в docker-compose доступен только из сети контейнеров, через nginx.
+TRUSTED_PROXIES = os.getenv(
+    'TRUSTED_PROXIES',
+    '127.0.0.0/8 10.0.0.0/8 172.16.0.0/12 192.168.0.0/16 ::1/128'
+).split()
+
+# Профилирование запросов персонала: кольцевой буфер на диске.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', default='True') == 'True'
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-profiles')
+)
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.001))
+
+# Дельта-синхронизация: размер пачки и срок хранения журнала изменений.
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', 500))
+SYNC_RETENTION_DAYS = int(os.getenv('SYNC_RETENTION_DAYS', 30))
+
+# Наибольшее число подзапросов в /api/batch/.
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+
+# Короткие ссылки: время кеширования редиректа и проверки поколения
+# карты id рецептов.
+SHORT_LINK_MAX_AGE = int(os.getenv('SHORT_LINK_MAX_AGE', 3600))
+SHORT_LINK_INDEX_CHECK_INTERVAL = float(
+    os.getenv('SHORT_LINK_INDEX_CHECK_INTERVAL', 5)
+)
+
+# Прогрев процесса при загрузке WSGI/ASGI-приложения (до fork воркеров
+# gunicorn с preload_app).
+WARMUP_ON_LOAD = os.getenv('WARMUP_ON_LOAD', default='True') == 'True'
+
+# Режим ASGI: горячие эндпоинты чтения выполняются асинхронно.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='False') == 'True'
+
+# Server-sent events: опрос журнала изменений и keep-alive соединения.
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', 1))
+SSE_HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', 15))
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', 100))
+# Срок действия билета для подключения EventSource, в секундах.
+SSE_TICKET_MAX_AGE = int(os.getenv('SSE_TICKET_MAX_AGE', 30))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
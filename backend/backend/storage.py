@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по хешу содержимого.
+
+    Файл сохраняется как <каталог>/<2 символа хеша>/<хеш>.<расширение>,
+    повторная загрузка тех же байтов не пишет файл заново. Содержимое
+    по такому имени никогда не меняется, поэтому nginx отдаёт его
+    с неограниченным кешированием.
+    """
+
+    def hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        if content.seekable():
+            content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+        if content.seekable():
+            content.seek(0)
+        digest = sha256.hexdigest()
+        dirname, basename = os.path.split(name)
+        ext = os.path.splitext(basename)[1].lower()
+        return os.path.join(dirname, digest[:2], digest + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
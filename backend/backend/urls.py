@@ -1,8 +1,19 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from api.profiling import profile_download, profile_list
 
 urlpatterns = [
+    path(
+        'admin/profiles/',
+        admin.site.admin_view(profile_list),
+        name='profile_list'
+    ),
+    path(
+        'admin/profiles/<str:profile_id>/',
+        admin.site.admin_view(profile_download),
+        name='profile_download'
+    ),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls', namespace='api')),
     path('', include('recipes.urls', namespace='recipes')),
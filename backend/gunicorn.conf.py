@@ -0,0 +1,3 @@
+# Приложение загружается в master-процессе до fork: воркеры получают
+# прогретые данные (api/warmup.py) и делят их страницы copy-on-write.
+preload_app = True
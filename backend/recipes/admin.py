@@ -1,11 +1,19 @@
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
-from .models import Tag, Ingredient, Recipe, RecipeIngredient
+from backend.paginators import EstimatedCountPaginator
+
+from .models import Favorites, Tag, Ingredient, Recipe, RecipeIngredient
 
 
 class RecipeIngredientAdmin(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 @admin.register(Recipe)
@@ -18,14 +26,34 @@ class RecipeAdmin(admin.ModelAdmin):
         'author',
         'count_favorite'
     )
-    search_fields = ('name', 'author')
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__email', 'author__username')
     list_display_links = ('name', 'author',)
     list_filter = ('tags',)
+    autocomplete_fields = ('author', 'tags')
     empty_value_display = 'Не задано'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Подзапрос, а не JOIN с GROUP BY: фильтр по тегам не умножает
+        # счётчик, а подсчёт строк списка не группирует всю таблицу.
+        favorites = Favorites.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            count=Count('id')
+        ).values('count')
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(
+                Subquery(favorites, output_field=IntegerField()), 0
+            )
+        )
 
-    @admin.display(description='Количество в избранных')
+    @admin.display(
+        description='Количество в избранных', ordering='favorites_count'
+    )
     def count_favorite(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
@@ -37,6 +65,16 @@ class IngredientAdmin(admin.ModelAdmin):
     )
     search_fields = ('name',)
     list_display_links = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
 
-admin.site.register(Tag)
+    list_display = (
+        'name',
+        'slug'
+    )
+    search_fields = ('name', 'slug')
+    list_display_links = ('name',)
@@ -1,24 +1,310 @@
 import csv
+import io
+import json
+import time
+from itertools import chain, islice
+from pathlib import Path
 
+from django.apps import apps
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import UniqueConstraint
 
-from recipes.models import Ingredient
+from backend.cache import invalidate
+from recipes.models import Ingredient, Tag
 
-RATIO_DATA = {
-    Ingredient: 'ingredients.csv',
+# Модель определяется по имени файла, если не указан --model.
+MODELS = {
+    'ingredients': Ingredient,
+    'tags': Tag,
 }
+DEFAULT_FILES = ('ingredients.csv', 'tags.json')
+JSON_CHUNK_SIZE = 1 << 16
+
+
+def iter_json_array(file):
+    """Потоково разбирает JSON-массив объектов, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: file.read(JSON_CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив объектов.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item
+        buffer = buffer[position:]
+    if buffer.strip() or not started:
+        raise CommandError('Некорректный или незавершённый JSON.')
+
+
+def read_rows(path):
+    """Строки файла CSV, JSON или NDJSON в виде словарей."""
+    suffix = path.suffix.lower()
+    with open(path, encoding='utf-8', newline='') as file:
+        if suffix == '.csv':
+            rows = csv.DictReader(file)
+        elif suffix in ('.jsonl', '.ndjson'):
+            rows = (json.loads(line) for line in file if line.strip())
+        elif suffix == '.json':
+            rows = iter_json_array(file)
+        else:
+            raise CommandError(f'Неизвестный формат файла: {path.name}')
+        for row in rows:
+            # Фикстуры Django хранят значения в ключе fields.
+            yield row.get('fields', row)
+
+
+def unique_keys(model):
+    """Уникальные ключи модели, кроме первичного."""
+    keys = [
+        tuple(constraint.fields) for constraint in model._meta.constraints
+        if isinstance(constraint, UniqueConstraint)
+        and not constraint.condition
+    ]
+    keys.extend(tuple(together) for together in model._meta.unique_together)
+    keys.extend(
+        (field.name,) for field in model._meta.concrete_fields
+        if field.unique and not field.primary_key
+    )
+    if not keys:
+        raise CommandError(
+            f'У модели {model._meta.label} нет уникального ключа.'
+        )
+    return keys
+
+
+def conflict_fields(model):
+    """Поля уникального ключа, по которому определяется конфликт."""
+    return unique_keys(model)[0]
+
+
+def sql_row(model, table, names):
+    """Столбцы полей таблицы в виде строки SQL: (t.a, t.b)."""
+    quote = connection.ops.quote_name
+    return '({})'.format(', '.join(
+        f'{table}.{quote(model._meta.get_field(name).column)}'
+        for name in names
+    ))
 
 
 class Command(BaseCommand):
-    help = 'Команда добавляет данные в БД из csv файлов'
-
-    def handle(self, *args, **kwargs):
-        for model, file in RATIO_DATA.items():
-            with open(
-                f'{settings.BASE_DIR}/data/{file}',
-                'r', encoding='utf-8'
-            ) as csv_data:
-                reader = csv.DictReader(csv_data)
-                model.objects.bulk_create(model(**data) for data in reader)
-            self.stdout.write(self.style.SUCCESS('Загрузка прошла успешно'))
+    help = (
+        'Команда загружает данные в БД из файлов csv, json и ndjson '
+        'пачками, повторный запуск не создаёт дубликатов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='*',
+            help='Файлы для загрузки, по умолчанию ингредиенты и теги '
+                 'из каталога data.',
+        )
+        parser.add_argument(
+            '--model',
+            help='Модель в виде app_label.Model, по умолчанию определяется '
+                 'по имени файла.',
+        )
+        parser.add_argument(
+            '--on-conflict', choices=('ignore', 'update'), default='ignore',
+            help='Что делать с уже существующими строками.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.on_conflict = options['on_conflict']
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        files = [Path(file) for file in options['files']] or [
+            settings.BASE_DIR / 'data' / file for file in DEFAULT_FILES
+        ]
+        for path in files:
+            if not path.exists():
+                raise CommandError(f'Файл не найден: {path}')
+            model = self.get_model(path, options['model'])
+            started = time.perf_counter()
+            load = self.copy_rows if use_copy else self.bulk_rows
+            read, written = load(model, self.clean_rows(model, path))
+            # bulk_create и COPY не отправляют сигналы моделей.
+            invalidate(model._meta.label_lower)
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            self.stdout.write(self.style.SUCCESS(
+                f'{path.name} -> {model._meta.label}: прочитано {read}, '
+                f'записано {written} строк за {elapsed:.2f} с '
+                f'({read / elapsed:.0f} строк/с)'
+            ))
+
+    def get_model(self, path, label):
+        if label:
+            try:
+                return apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError(f'Неизвестная модель: {label}')
+        try:
+            return MODELS[path.stem]
+        except KeyError:
+            raise CommandError(
+                f'Не удалось определить модель для {path.name}, '
+                'укажите --model.'
+            )
+
+    def clean_rows(self, model, path):
+        """Приводит значения к типам полей модели."""
+        fields = None
+        for row in read_rows(path):
+            if fields is None:
+                fields = [
+                    field for field in model._meta.concrete_fields
+                    if not field.primary_key
+                    and (field.name in row or field.attname in row)
+                ]
+                missing = set(conflict_fields(model)) - {
+                    field.name for field in fields
+                }
+                if missing:
+                    raise CommandError(
+                        f'В {path.name} нет полей: {", ".join(missing)}'
+                    )
+                self.fields = fields
+            values = {}
+            for field in fields:
+                value = row.get(field.name, row.get(field.attname))
+                if isinstance(value, str):
+                    value = value.strip()
+                values[field.attname] = field.to_python(value)
+            yield values
+
+    def batches(self, rows):
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            yield batch
+
+    def bulk_rows(self, model, rows):
+        """Загрузка через ORM, работает на любой БД."""
+        key = [model._meta.get_field(name).attname
+               for name in conflict_fields(model)]
+        read = updated = 0
+        before = model.objects.count()
+        for batch in self.batches(rows):
+            read += len(batch)
+            unique = {tuple(row[name] for name in key): row for row in batch}
+            with transaction.atomic():
+                if self.on_conflict == 'update':
+                    updated += self.update_existing(model, key, unique)
+                model.objects.bulk_create(
+                    (model(**row) for row in unique.values()),
+                    ignore_conflicts=True,
+                )
+        return read, updated + model.objects.count() - before
+
+    def update_existing(self, model, key, unique):
+        """Обновляет существующие строки и убирает их из пачки."""
+        update_fields = [
+            field.attname for field in self.fields
+            if field.attname not in key
+        ]
+        existing = []
+        for obj in model.objects.filter(**{
+            f'{key[0]}__in': {values[0] for values in unique}
+        }):
+            row = unique.pop(
+                tuple(getattr(obj, name) for name in key), None
+            )
+            if row is not None and update_fields:
+                for name in update_fields:
+                    setattr(obj, name, row[name])
+                existing.append(obj)
+        if existing:
+            model.objects.bulk_update(existing, update_fields)
+        return len(existing)
+
+    def copy_rows(self, model, rows):
+        """COPY во временную таблицу и INSERT ... ON CONFLICT из неё."""
+        batches = self.batches(rows)
+        first = next(batches, None)
+        if first is None:
+            return 0, 0
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        staging = quote(f'{model._meta.db_table}_staging')
+        key, *other_keys = unique_keys(model)
+        columns = ', '.join(quote(field.column) for field in self.fields)
+        key_columns = ', '.join(
+            quote(model._meta.get_field(name).column) for name in key
+        )
+        updates = ', '.join(
+            f'{quote(field.column)} = EXCLUDED.{quote(field.column)}'
+            for field in self.fields if field.name not in key
+        )
+        condition = ''
+        if self.on_conflict == 'update' and updates:
+            action = f'ON CONFLICT ({key_columns}) DO UPDATE SET {updates}'
+            # ON CONFLICT с целью ловит только её ключ. Строка, другой
+            # уникальный ключ которой занят другой строкой, пропускается,
+            # иначе весь INSERT упадёт с IntegrityError.
+            condition = ''.join(
+                f'AND NOT EXISTS (SELECT 1 FROM {table} AS existing '
+                f'WHERE {sql_row(model, "existing", names)} = '
+                f'{sql_row(model, staging, names)} '
+                f'AND {sql_row(model, "existing", key)} IS DISTINCT FROM '
+                f'{sql_row(model, staging, key)}) '
+                for names in other_keys
+            )
+        else:
+            # Без цели DO NOTHING пропускает конфликт по любому
+            # уникальному ключу.
+            action = 'ON CONFLICT DO NOTHING'
+        copy_options = 'FORMAT csv'
+        nullable = [quote(field.column) for field in self.fields if field.null]
+        if nullable:
+            # Пустая строка в CSV остаётся строкой, NULL только для
+            # допускающих его полей.
+            copy_options += f', FORCE_NULL ({", ".join(nullable)})'
+        read = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA'
+            )
+            for batch in chain([first], batches):
+                buffer = io.StringIO()
+                csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(
+                    [row[field.attname] for field in self.fields]
+                    for row in batch
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY {staging} ({columns}) FROM STDIN '
+                    f'WITH ({copy_options})',
+                    buffer
+                )
+                read += len(batch)
+            # DISTINCT ON: повтор ключа во входных данных не должен
+            # обновлять одну строку дважды в одном INSERT.
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT DISTINCT ON ({key_columns}) {columns} '
+                f'FROM {staging} WHERE TRUE {condition}{action}'
+            )
+            written = cursor.rowcount
+        return read, written
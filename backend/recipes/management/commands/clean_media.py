@@ -0,0 +1,73 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+CHUNK_SIZE = 2000
+IMAGE_COLUMNS = (
+    (Recipe, 'image'),
+    (User, 'avatar'),
+)
+
+
+def walk_files(root):
+    """Обходит каталог потоково, не собирая список файлов в памяти."""
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = 'Команда удаляет из MEDIA_ROOT файлы, на которые нет ссылок в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, ничего не удаляя.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе указанного числа секунд.',
+        )
+
+    def handle(self, *args, **options):
+        media_root = os.fspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(media_root):
+            self.stdout.write(f'Каталог {media_root} не найден.')
+            return
+        referenced = set()
+        for model, column in IMAGE_COLUMNS:
+            referenced.update(
+                model.objects.exclude(**{column: ''}).values_list(
+                    column, flat=True
+                ).iterator(chunk_size=CHUNK_SIZE)
+            )
+        deadline = time.time() - options['min_age']
+        removed = freed = 0
+        for entry in walk_files(media_root):
+            name = os.path.relpath(entry.path, media_root).replace(os.sep, '/')
+            stat = entry.stat(follow_symlinks=False)
+            if name in referenced or stat.st_mtime > deadline:
+                continue
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(name)
+            if not options['dry_run']:
+                os.remove(entry.path)
+            removed += 1
+            freed += stat.st_size
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов без ссылок: {removed} ({freed} байт)'
+        ))
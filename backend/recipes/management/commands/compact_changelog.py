@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections, router
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from recipes.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = (
+        'Команда сжимает журнал изменений: удаляет записи, перекрытые '
+        'более новыми для того же объекта, и записи старше срока хранения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SYNC_RETENTION_DAYS,
+            help='Срок хранения записей в днях.',
+        )
+
+    def handle(self, *args, **options):
+        # Позиция записи: txid на PostgreSQL, id на SQLite (см. api.sync).
+        position = 'id'
+        if connections[router.db_for_write(ChangeLog)].vendor == 'postgresql':
+            position = 'txid'
+        first = ChangeLog.objects.order_by(position, 'id').first()
+        if first is None:
+            self.stdout.write('Журнал пуст.')
+            return
+        last = ChangeLog.objects.aggregate(last=Max('id'))['last']
+        # Перекрытая запись не нужна ни одному курсору: более новая
+        # запись того же объекта всё равно будет после него. Первая по
+        # позиции запись остаётся, по ней проверяется устаревший курсор.
+        newer = ChangeLog.objects.filter(
+            Q(**{f'{position}__gt': OuterRef(position)})
+            | Q(**{position: OuterRef(position), 'id__gt': OuterRef('id')}),
+            kind=OuterRef('kind'),
+            object_id=OuterRef('object_id'),
+        )
+        superseded = 0
+        for owner, newer_owner in (
+            ({'user__isnull': True}, {'user__isnull': True}),
+            ({'user__isnull': False}, {'user': OuterRef('user')}),
+        ):
+            superseded += ChangeLog.objects.filter(
+                Exists(newer.filter(**newer_owner)), **owner
+            ).exclude(id=first.id).delete()[0]
+        # Последняя запись остаётся всегда, иначе пустой журнал не
+        # позволит отличить устаревший курсор от актуального.
+        expired = ChangeLog.objects.filter(
+            created__lt=timezone.now() - timedelta(days=options['days'])
+        ).exclude(id=last).delete()[0]
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено перекрытых записей: {superseded}, '
+            f'устаревших: {expired}'
+        ))
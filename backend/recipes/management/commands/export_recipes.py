@@ -0,0 +1,106 @@
+import base64
+import json
+import sys
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredient, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        'Команда выгружает рецепты с ингредиентами, тегами и авторами '
+        'в NDJSON, по одному рецепту в строке'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки, по умолчанию stdout.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--images', action='store_true',
+            help='Встроить картинки в выгрузку в base64.',
+        )
+        parser.add_argument(
+            '--after-id', type=int, default=0,
+            help='Выгрузить только рецепты с id больше указанного.',
+        )
+
+    def handle(self, *args, **options):
+        self.images = options['images']
+        self.tags = {
+            tag['id']: tag for tag in Tag.objects.values('id', 'name', 'slug')
+        }
+        recipes = (
+            Recipe.objects.filter(id__gt=options['after_id'])
+            .select_related('author')
+            .order_by('id')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        if options['output'] == '-':
+            output = sys.stdout
+        else:
+            output = open(options['output'], 'w', encoding='utf-8')
+        started = time.perf_counter()
+        total = 0
+        try:
+            while chunk := list(islice(recipes, options['chunk_size'])):
+                for line in self.serialize_chunk(chunk):
+                    output.write(line)
+                total += len(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {total} за {elapsed:.1f} с '
+            f'({total / elapsed:.0f} в секунду)'
+        ))
+
+    def serialize_chunk(self, chunk):
+        """Строки NDJSON для пачки рецептов: по запросу на связи."""
+        ids = [recipe.id for recipe in chunk]
+        ingredients = defaultdict(list)
+        for row in RecipeIngredient.objects.filter(recipe_id__in=ids).values(
+            'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+            'amount'
+        ).order_by('id'):
+            ingredients[row['recipe_id']].append({
+                'name': row['ingredient__name'],
+                'measurement_unit': row['ingredient__measurement_unit'],
+                'amount': row['amount'],
+            })
+        tags = defaultdict(list)
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).values_list('recipe_id', 'tag_id'):
+            tag = self.tags[tag_id]
+            tags[recipe_id].append({'name': tag['name'], 'slug': tag['slug']})
+        for recipe in chunk:
+            data = {
+                'id': recipe.id,
+                'author': {
+                    'email': recipe.author.email,
+                    'username': recipe.author.username,
+                    'first_name': recipe.author.first_name,
+                    'last_name': recipe.author.last_name,
+                },
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': recipe.image.name,
+                'tags': tags[recipe.id],
+                'ingredients': ingredients[recipe.id],
+            }
+            if self.images and recipe.image:
+                with default_storage.open(recipe.image.name, 'rb') as file:
+                    data['image_data'] = base64.b64encode(
+                        file.read()
+                    ).decode()
+            yield json.dumps(data, ensure_ascii=False) + '\n'
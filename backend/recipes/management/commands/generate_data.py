@@ -0,0 +1,257 @@
+import io
+import random
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+
+from backend.cache import bump_generation, invalidate
+from recipes import shortlinks
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Суп', 'soup'),
+    ('Салат', 'salad'),
+    ('Выпечка', 'baking'),
+    ('Напиток', 'drink'),
+)
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Рагу', 'Омлет', 'Паста', 'Запеканка',
+    'Каша', 'Котлеты', 'Плов', 'Блины', 'Соус', 'Смузи', 'Жаркое',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'пряный', 'летний', 'зимний', 'бабушкин',
+    'острый', 'нежный', 'постный', 'праздничный', 'простой', 'сытный',
+)
+WORDS = (
+    'нарезать', 'смешать', 'добавить', 'обжарить', 'варить', 'посолить',
+    'остудить', 'подавать', 'минут', 'огонь', 'масло', 'тесто', 'соус',
+    'аккуратно', 'до', 'готовности', 'затем', 'перемешать', 'и', 'в',
+)
+
+
+def power_law_weights(count, alpha, rng):
+    """Веса 1/rank^alpha в случайном порядке."""
+    weights = [1 / (rank ** alpha) for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return weights
+
+
+def weighted_sample(population, weights, count, rng):
+    """Выборка без повторов с учётом весов."""
+    count = min(count, len(population))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.update(rng.choices(population, weights, k=count - len(chosen)))
+    return chosen
+
+
+def placeholder_image():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (230, 180, 120)).save(buffer, 'PNG')
+    return default_storage.save(
+        'recipes/images/synthetic.png', ContentFile(buffer.getvalue())
+    )
+
+
+class Command(BaseCommand):
+    help = 'Команда генерирует синтетические данные для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--recipes', type=int, default=5000,
+            help='Общее число рецептов, авторы выбираются по степенному '
+                 'закону.',
+        )
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=4)
+        parser.add_argument('--follows-per-user', type=int, default=8)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона популярности.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--password', default='synthetic-password')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.alpha = options['alpha']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                'укажите другой --prefix.'
+            )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Сначала загрузите ингредиенты: add_data.')
+        started = time.perf_counter()
+        tag_ids = self.create_tags()
+        user_ids = self.create_users(
+            prefix, options['users'], options['password']
+        )
+        recipes = self.create_recipes(prefix, user_ids, options['recipes'])
+        recipe_ids = [recipe_id for recipe_id, _ in recipes]
+        self.create_recipe_relations(recipe_ids, ingredient_ids, tag_ids)
+        recipe_weights = power_law_weights(
+            len(recipe_ids), self.alpha, self.rng
+        )
+        self.create_follows(
+            user_ids, recipes, recipe_weights, options['follows_per_user']
+        )
+        for model, per_user in (
+            (Favorites, options['favorites_per_user']),
+            (ShoppingCart, options['cart_per_user']),
+        ):
+            self.create_user_recipes(
+                model, user_ids, recipe_ids, recipe_weights, per_user
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def insert(self, model, objects):
+        """Вставляет объекты пачками, не держа весь набор в памяти."""
+        started = time.perf_counter()
+        objects = iter(objects)
+        total = 0
+        while batch := list(islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{model._meta.label}: {total} строк за {elapsed:.1f} с'
+        )
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            (Tag(name=name, slug=slug) for name, slug in TAGS),
+            ignore_conflicts=True
+        )
+        invalidate(Tag._meta.label_lower)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, prefix, count, password):
+        password = make_password(password)
+        self.insert(User, (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@foodgram.test',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(count)
+        ))
+        return list(
+            User.objects.filter(username__startswith=prefix)
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def create_recipes(self, prefix, user_ids, count):
+        image = placeholder_image()
+        authors = self.rng.choices(
+            user_ids,
+            power_law_weights(len(user_ids), self.alpha, self.rng),
+            k=count
+        )
+        self.insert(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=(
+                    f'{self.rng.choice(DISHES)} '
+                    f'{self.rng.choice(ADJECTIVES)} {number}'
+                ),
+                text=' '.join(self.rng.choices(
+                    WORDS, k=int(self.rng.lognormvariate(4.5, 0.8))
+                )),
+                image=image,
+                cooking_time=self.rng.randint(5, 180),
+            )
+            for number, author_id in enumerate(authors)
+        ))
+        # Вставка без сигналов: карте коротких ссылок нужно новое
+        # поколение.
+        bump_generation(shortlinks.NAMESPACE)
+        return list(
+            Recipe.objects.filter(author__username__startswith=prefix)
+            .order_by('id').values_list('id', 'author_id')
+        )
+
+    def create_recipe_relations(self, recipe_ids, ingredient_ids, tag_ids):
+        ingredient_weights = power_law_weights(
+            len(ingredient_ids), self.alpha, self.rng
+        )
+        self.insert(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.rng.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in weighted_sample(
+                ingredient_ids,
+                ingredient_weights,
+                self.rng.randint(3, 12),
+                self.rng
+            )
+        ))
+        self.insert(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(
+                tag_ids, min(len(tag_ids), self.rng.randint(1, 3))
+            )
+        ))
+
+    def create_follows(self, user_ids, recipes, recipe_weights, per_user):
+        # Подписываются на авторов популярных рецептов: вес автора —
+        # сумма весов его рецептов в избранном и корзине.
+        author_weights = defaultdict(float)
+        for (_, author_id), weight in zip(recipes, recipe_weights):
+            author_weights[author_id] += weight
+        authors = list(author_weights)
+        weights = list(author_weights.values())
+        self.insert(Subscriptions, (
+            Subscriptions(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in weighted_sample(
+                authors,
+                weights,
+                int(self.rng.expovariate(1 / per_user)) if per_user else 0,
+                self.rng
+            )
+            if author_id != user_id
+        ))
+
+    def create_user_recipes(self, model, user_ids, recipe_ids, weights,
+                            per_user):
+        self.insert(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in weighted_sample(
+                recipe_ids,
+                weights,
+                int(self.rng.expovariate(1 / per_user)) if per_user else 0,
+                self.rng
+            )
+        ))
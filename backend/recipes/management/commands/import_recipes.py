@@ -0,0 +1,305 @@
+import base64
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from backend.cache import bump_generation, invalidate
+from recipes import shortlinks
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Команда загружает рецепты из NDJSON, выгруженного export_recipes, '
+        'пачками с контрольными точками для продолжения после сбоя; '
+        'рецепты, которые у автора уже есть с тем же содержимым, '
+        'пропускаются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл NDJSON или - для stdin.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <input>.checkpoint.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не учитывая контрольную точку.',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.authors = {}
+        if options['input'] == '-':
+            stream = sys.stdin.buffer
+            checkpoint = None
+        else:
+            stream = open(options['input'], 'rb')
+            checkpoint = Path(
+                options['checkpoint'] or f'{options["input"]}.checkpoint'
+            )
+        try:
+            self.load(stream, checkpoint, options['restart'])
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+    def load(self, stream, checkpoint, restart):
+        state = {'offset': 0, 'lines': 0}
+        if checkpoint and checkpoint.exists() and not restart:
+            state = json.loads(checkpoint.read_text())
+            stream.seek(state['offset'])
+            self.stdout.write(
+                f'Продолжение с строки {state["lines"] + 1} '
+                f'по контрольной точке {checkpoint}'
+            )
+        started = time.perf_counter()
+        imported = skipped = 0
+        batch = []
+        while True:
+            line = stream.readline()
+            if line.strip():
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    raise CommandError(
+                        f'Строка {state["lines"] + len(batch) + 1}: '
+                        'некорректный JSON.'
+                    )
+            if batch and (len(batch) >= self.batch_size or not line):
+                saved = self.save_batch(batch)
+                imported += saved
+                skipped += len(batch) - saved
+                state['lines'] += len(batch)
+                batch = []
+                if checkpoint:
+                    state['offset'] = stream.tell()
+                    self.write_checkpoint(checkpoint, state)
+                elapsed = max(time.perf_counter() - started, 1e-6)
+                self.stdout.write(
+                    f'Загружено рецептов: {imported}, уже были: {skipped} '
+                    f'({state["lines"] / elapsed:.0f} строк в секунду)'
+                )
+            if not line:
+                break
+        if checkpoint and checkpoint.exists():
+            checkpoint.unlink()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена, рецептов: {imported}, уже были: {skipped}'
+        ))
+
+    @staticmethod
+    def write_checkpoint(checkpoint, state):
+        temporary = checkpoint.with_name(checkpoint.name + '.tmp')
+        temporary.write_text(json.dumps(state))
+        os.replace(temporary, checkpoint)
+
+    def save_batch(self, batch):
+        """Пачка рецептов в одной транзакции, возвращает число новых.
+
+        Рецепт определяется автором и содержимым: уже загруженные, в
+        том числе при повторном запуске или --restart, пропускаются.
+        """
+        with transaction.atomic():
+            self.resolve_authors(batch)
+            batch = self.exclude_existing(batch)
+            if not batch:
+                return 0
+            self.resolve_ingredients(batch)
+            self.resolve_tags(batch)
+            recipes = [
+                Recipe(
+                    author_id=self.authors[data['author']['email']],
+                    name=data['name'],
+                    text=data['text'],
+                    cooking_time=data['cooking_time'],
+                    image=self.save_image(data),
+                )
+                for data in batch
+            ]
+            if connection.features.can_return_rows_from_bulk_insert:
+                Recipe.objects.bulk_create(recipes)
+            else:
+                for recipe in recipes:
+                    recipe.save()
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=self.ingredients[
+                        ingredient['name'], ingredient['measurement_unit']
+                    ],
+                    amount=ingredient['amount'],
+                )
+                for recipe, data in zip(recipes, batch)
+                for ingredient in data['ingredients']
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(
+                    recipe_id=recipe.id, tag_id=self.tags[tag['slug']]
+                )
+                for recipe, data in zip(recipes, batch)
+                for tag in data['tags']
+            )
+            # bulk_create не отправляет сигналы, карте коротких ссылок
+            # нужно новое поколение.
+            transaction.on_commit(
+                lambda: bump_generation(shortlinks.NAMESPACE)
+            )
+        return len(batch)
+
+    @staticmethod
+    def recipe_key(author_id, data):
+        """Автор и содержимое рецепта в формате строки NDJSON."""
+        return (
+            author_id, data['name'], data['text'], data['cooking_time'],
+            tuple(sorted(
+                (ingredient['name'], ingredient['measurement_unit'],
+                 ingredient['amount'])
+                for ingredient in data['ingredients']
+            )),
+            tuple(sorted(tag['slug'] for tag in data['tags'])),
+        )
+
+    def exclude_existing(self, batch):
+        """Рецепты пачки, которых ещё нет у авторов.
+
+        Одно название не значит один рецепт: у автора может быть
+        несколько рецептов с одним названием, поэтому сравнивается всё
+        содержимое уже загруженных рецептов с тем же названием.
+        """
+        authors = [self.authors[data['author']['email']] for data in batch]
+        existing = {
+            recipe['id']: {**recipe, 'ingredients': [], 'tags': []}
+            for recipe in Recipe.objects.filter(
+                author_id__in=set(authors),
+                name__in={data['name'] for data in batch},
+            ).values('id', 'author_id', 'name', 'text', 'cooking_time')
+        }
+        if existing:
+            for row in RecipeIngredient.objects.filter(
+                recipe_id__in=existing
+            ).values(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            ):
+                existing[row['recipe_id']]['ingredients'].append({
+                    'name': row['ingredient__name'],
+                    'measurement_unit': row['ingredient__measurement_unit'],
+                    'amount': row['amount'],
+                })
+            for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=existing
+            ).values_list('recipe_id', 'tag__slug'):
+                existing[recipe_id]['tags'].append({'slug': slug})
+        seen = {
+            self.recipe_key(recipe['author_id'], recipe)
+            for recipe in existing.values()
+        }
+        new = []
+        for author_id, data in zip(authors, batch):
+            key = self.recipe_key(author_id, data)
+            if key not in seen:
+                seen.add(key)
+                new.append(data)
+        return new
+
+    def resolve_authors(self, batch):
+        authors = {
+            data['author']['email']: data['author'] for data in batch
+            if data['author']['email'] not in self.authors
+        }
+        if not authors:
+            return
+        self.authors.update(
+            User.objects.filter(email__in=authors).values_list('email', 'id')
+        )
+        missing = [
+            author for email, author in authors.items()
+            if email not in self.authors
+        ]
+        if missing:
+            users = [User(**author) for author in missing]
+            for user in users:
+                user.set_unusable_password()
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            self.authors.update(
+                User.objects.filter(
+                    email__in=[author['email'] for author in missing]
+                ).values_list('email', 'id')
+            )
+        for email in authors:
+            if email not in self.authors:
+                raise CommandError(
+                    f'Не удалось создать автора {email}: имя пользователя '
+                    'уже занято.'
+                )
+
+    def resolve_ingredients(self, batch):
+        missing = {
+            (ingredient['name'], ingredient['measurement_unit'])
+            for data in batch for ingredient in data['ingredients']
+        } - self.ingredients.keys()
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing),
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(
+            lambda: invalidate(Ingredient._meta.label_lower)
+        )
+        for pk, name, unit in Ingredient.objects.filter(
+            name__in={name for name, _ in missing}
+        ).values_list('id', 'name', 'measurement_unit'):
+            self.ingredients[name, unit] = pk
+
+    def resolve_tags(self, batch):
+        missing = {
+            tag['slug']: tag for data in batch for tag in data['tags']
+            if tag['slug'] not in self.tags
+        }
+        if not missing:
+            return
+        Tag.objects.bulk_create(
+            (Tag(name=tag['name'], slug=tag['slug'])
+             for tag in missing.values()),
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(lambda: invalidate(Tag._meta.label_lower))
+        self.tags.update(
+            Tag.objects.filter(slug__in=missing).values_list('slug', 'id')
+        )
+        for slug, tag in missing.items():
+            if slug not in self.tags:
+                raise CommandError(
+                    f'Не удалось создать тег {slug}: название '
+                    f'«{tag["name"]}» уже занято тегом с другим slug.'
+                )
+
+    @staticmethod
+    def save_image(data):
+        if 'image_data' not in data:
+            return data['image']
+        return default_storage.save(
+            data['image'],
+            ContentFile(base64.b64decode(data['image_data']))
+        )
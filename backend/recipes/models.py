@@ -70,6 +70,9 @@ class Recipe(models.Model):
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
         ordering = ('name',)
+        indexes = [
+            models.Index(fields=['name', 'id'], name='recipe_name')
+        ]
 
     def __str__(self):
         return self.name
@@ -100,14 +103,21 @@ class RecipeIngredient(models.Model):
 
 
 class FavotiteShoppingCartBaseModel(models.Model):
-    """Базовая модель избранного и корзины."""
+    """Базовая модель избранного и корзины.
+
+    Отдельные индексы внешних ключей не нужны: поиск по рецепту покрывает
+    уникальное ограничение (recipe, user), по пользователю — индекс
+    (user, recipe).
+    """
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
     class Meta:
@@ -125,6 +135,9 @@ class Favorites(FavotiteShoppingCartBaseModel):
                 name='unique_recipe_user_fav'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'recipe'], name='favorites_user')
+        ]
 
 
 class ShoppingCart(FavotiteShoppingCartBaseModel):
@@ -138,3 +151,75 @@ class ShoppingCart(FavotiteShoppingCartBaseModel):
                 name='unique_recipe_user_shop'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'], name='shopping_cart_user'
+            )
+        ]
+
+
+class ChangeLog(models.Model):
+    """Журнал изменений для синхронизации клиентов.
+
+    Записи рецептов общие, записи избранного, корзины и подписок
+    относятся к пользователю. Курсор синхронизации — позиция записи:
+    txid транзакции на PostgreSQL, id на SQLite (см. api.sync).
+    """
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'рецепт'),
+        (FAVORITE, 'избранное'),
+        (SHOPPING_CART, 'корзина'),
+        (SUBSCRIPTION, 'подписка'),
+    )
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OPERATIONS = (
+        (UPSERT, 'создание или изменение'),
+        (DELETE, 'удаление'),
+    )
+
+    # Без ограничения в БД: при удалении пользователя сигналы удаления
+    # его избранного и подписок пишут записи с его id в той же
+    # транзакции; они удаляются compact_changelog по сроку хранения.
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    # Автор рецепта: по нему /api/events/ выбирает получателей, в том
+    # числе для удалённых рецептов.
+    author = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    # Id транзакции PostgreSQL, в SQLite не заполняется.
+    txid = models.BigIntegerField(null=True, blank=True)
+    kind = models.CharField(max_length=16, choices=KINDS)
+    object_id = models.PositiveBigIntegerField()
+    op = models.CharField(max_length=8, choices=OPERATIONS)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'изменение'
+        verbose_name_plural = 'журнал изменений'
+        ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=['kind', 'object_id'], name='changelog_object'
+            ),
+            models.Index(fields=['txid', 'id'], name='changelog_txid'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id} {self.op}'
@@ -0,0 +1,180 @@
+"""Короткие ссылки на рецепты.
+
+Код ссылки — id рецепта в системе счисления из 52 латинских букв, поэтому
+не пересекается со старыми ссылками вида /s/<id>/. Существование рецепта
+проверяется по битовой карте id в памяти процесса без запросов к БД:
+её обновляют сигналы создания и удаления рецепта. Каждое изменение
+публикуется в общем кеше под очередным номером, и другие процессы
+применяют пропущенные изменения к своей карте, не перечитывая её.
+Массовые загрузки без сигналов (import_recipes, generate_data) меняют
+поколение, и тогда карта перечитывается из БД целиком.
+"""
+import string
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from backend.cache import bump_generation, get_generation
+
+from .models import Recipe
+
+ALPHABET = string.ascii_letters
+BASE = len(ALPHABET)
+DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+NAMESPACE = 'recipe_ids'
+# Код из 12 букв может выйти за bigint (52 ** 12 > 2 ** 63), а 11 букв
+# покрывают id до 52 ** 11 - 1, около 7,4 * 10 ** 18.
+MAX_CODE_LENGTH = 11
+MAX_PK = 2 ** 63 - 1
+SEQUENCE_KEY = 'recipe_ids:sequence'
+DELTA_KEY = 'recipe_ids:delta:{}'
+DELTA_TIMEOUT = 3600
+# Больше пропущенных изменений процесс не догоняет, а перечитывает карту.
+MAX_DELTAS = 1000
+
+
+def encode(pk):
+    code = []
+    while True:
+        pk, digit = divmod(pk, BASE)
+        code.append(ALPHABET[digit])
+        if not pk:
+            return ''.join(reversed(code))
+
+
+def decode(code):
+    """Id рецепта по коду или None для некорректного кода."""
+    if not code or len(code) > MAX_CODE_LENGTH:
+        return None
+    pk = 0
+    for char in code:
+        digit = DIGITS.get(char)
+        if digit is None:
+            return None
+        pk = pk * BASE + digit
+    return pk if pk <= MAX_PK else None
+
+
+class RecipeIdIndex:
+    """Битовая карта id существующих рецептов."""
+
+    def __init__(self):
+        self.bits = None
+        self.generation = None
+        # Номер и id последнего учтённого изменения: счётчик может быть
+        # вытеснен из кеша и начаться заново, тогда под прежним номером
+        # окажется другое изменение.
+        self.sequence = 0
+        self.delta_id = None
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+    def load(self):
+        bits = bytearray()
+        for pk in Recipe.objects.values_list('id', flat=True).iterator():
+            byte = pk >> 3
+            if byte >= len(bits):
+                bits.extend(bytes(max(byte + 1 - len(bits), len(bits))))
+            bits[byte] |= 1 << (pk & 7)
+        return bits
+
+    def refresh(self, force=False):
+        """Догоняет изменения других процессов."""
+        now = time.monotonic()
+        if not force and self.bits is not None and (
+            now - self.checked < settings.SHORT_LINK_INDEX_CHECK_INTERVAL
+        ):
+            return
+        generation = get_generation(NAMESPACE)
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        with self.lock:
+            self.checked = now
+            if (self.bits is not None and generation == self.generation
+                    and self.catch_up(sequence)):
+                return
+            # Изменения до номера sequence зафиксированы до загрузки.
+            self.generation = generation
+            self.sequence = sequence
+            delta = cache.get(DELTA_KEY.format(sequence))
+            self.delta_id = delta[0] if delta else None
+            self.bits = self.load()
+
+    def catch_up(self, sequence):
+        """Применяет изменения до номера sequence; False, если их нет."""
+        if not self.sequence <= sequence <= self.sequence + MAX_DELTAS:
+            return False
+        keys = [
+            DELTA_KEY.format(number)
+            for number in range(self.sequence, sequence + 1)
+        ]
+        deltas = cache.get_many(keys)
+        if deltas.get(keys[0], (None,))[0] != self.delta_id:
+            return False
+        if any(key not in deltas for key in keys[1:]):
+            return False
+        for key in keys[1:]:
+            self.delta_id, pk, present = deltas[key]
+            self.flip(pk, present)
+        self.sequence = sequence
+        return True
+
+    def flip(self, pk, present):
+        byte = pk >> 3
+        if byte >= len(self.bits):
+            if not present:
+                return
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if present:
+            self.bits[byte] |= 1 << (pk & 7)
+        else:
+            self.bits[byte] &= ~(1 << (pk & 7)) & 0xFF
+
+    def set(self, pk, present):
+        with self.lock:
+            if self.bits is not None:
+                self.flip(pk, present)
+
+    def has(self, pk):
+        byte = pk >> 3
+        bits = self.bits
+        return byte < len(bits) and bool(bits[byte] & (1 << (pk & 7)))
+
+    def __contains__(self, pk):
+        self.refresh()
+        if self.has(pk):
+            return True
+        # Рецепт мог появиться в другом процессе после последней
+        # проверки: поколение сверяется сразу, БД не запрашивается.
+        self.refresh(force=True)
+        return self.has(pk)
+
+    def changed(self, pk, present):
+        """Вызывается после создания или удаления рецепта.
+
+        Свой процесс обновляет карту сразу, остальные применяют
+        опубликованное изменение при следующей проверке.
+        """
+        self.set(pk, present)
+        cache.add(SEQUENCE_KEY, 0, None)
+        try:
+            sequence = cache.incr(SEQUENCE_KEY)
+        except ValueError:
+            # Счётчик вытеснен между add и incr: все перечитают карту.
+            bump_generation(NAMESPACE)
+            return
+        delta_id = uuid.uuid4().hex
+        cache.set(
+            DELTA_KEY.format(sequence), (delta_id, pk, present),
+            DELTA_TIMEOUT
+        )
+        with self.lock:
+            # Своё изменение не нужно применять при следующей проверке.
+            if self.bits is not None and self.sequence == sequence - 1:
+                self.sequence = sequence
+                self.delta_id = delta_id
+
+
+recipe_ids = RecipeIdIndex()
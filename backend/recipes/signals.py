@@ -0,0 +1,19 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Recipe
+from .shortlinks import recipe_ids
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_id(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(recipe_ids.changed, instance.pk, True))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_id(sender, instance, **kwargs):
+    transaction.on_commit(partial(recipe_ids.changed, instance.pk, False))
@@ -1,9 +1,19 @@
 from django.urls import path
 
-from .views import redirect_to_recipe
+from backend.async_views import async_read_view
+from .views import redirect_short_link, redirect_to_recipe
 
 app_name = 'recipes'
 
 urlpatterns = [
-    path('s/<int:pk>/', redirect_to_recipe, name='short_link'),
+    path(
+        's/<int:pk>/',
+        async_read_view(redirect_to_recipe),
+        name='short_link_legacy'
+    ),
+    path(
+        's/<str:code>/',
+        async_read_view(redirect_short_link),
+        name='short_link'
+    ),
 ]
@@ -1,11 +1,27 @@
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import redirect
-from django.core.exceptions import ValidationError
+from django.utils.cache import patch_cache_control
 
-from .models import Recipe
+from .shortlinks import decode, recipe_ids
+
+
+def recipe_redirect(pk):
+    """Кешируемый редирект на страницу рецепта или 404."""
+    if pk is None or pk not in recipe_ids:
+        raise Http404('Рецепт не найден.')
+    response = redirect(f'/recipes/{pk}/')
+    patch_cache_control(
+        response, public=True, max_age=settings.SHORT_LINK_MAX_AGE
+    )
+    return response
 
 
 def redirect_to_recipe(request, pk):
-    """Редирект на страницу рецепта."""
-    if Recipe.objects.filter(pk=pk).exists():
-        return redirect(f'/recipes/{pk}/')
-    raise ValidationError(f'Рецепт с id {pk} не найден.')
+    """Редирект по старой ссылке с id рецепта."""
+    return recipe_redirect(pk)
+
+
+def redirect_short_link(request, code):
+    """Редирект по короткому коду рецепта."""
+    return recipe_redirect(decode(code))
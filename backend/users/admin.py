@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as Admin
 from django.contrib.auth.models import Group
 
+from backend.paginators import EstimatedCountPaginator
+
 from .models import User
 
 
@@ -16,6 +18,8 @@ class UserAdmin(Admin):
     search_fields = ('username', 'email')
     list_display_links = ('username',)
     empty_value_display = 'Не задано'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
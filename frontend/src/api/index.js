@@ -142,7 +142,7 @@ class Api {
           .join("")
       : "";
     return fetch(
-      `/api/recipes/?page=${page}&limit=${limit}${
+      `/api/recipes/?page=${page}&limit=${limit}&omit=text,ingredients${
         author ? `&author=${author}` : ""
       }${is_favorited ? `&is_favorited=${is_favorited}` : ""}${
         is_in_shopping_cart ? `&is_in_shopping_cart=${is_in_shopping_cart}` : ""